@@ -0,0 +1,76 @@
+"""
+Measure summarize with the *if aggregates, e.g. sumif(A, B > 50), against calling a Python function on each group,
+which is how they were computed before.
+
+The groupby methods only run once for all of the groups, so the difference grows with the number of groups.
+
+    python benchmarks/bench_if_aggregates.py [rows] [groups ...]
+"""
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from kusto_pandas import Wrap
+from kusto_pandas.expression_parser.aggregates import SimpleIfAgg
+
+AGGREGATES = [
+    "sumif(A, B > 50)",
+    "avgif(A, B > 50), maxif(B, A > 0.5), dcountif(B, A > 0.5)",
+]
+
+def _apply_per_group(self, grouped):
+    return grouped.apply(self.apply_aggregate_series)
+
+def _create_df(rows, groups):
+    rng = np.random.RandomState(0)
+    return pd.DataFrame({
+        "G": rng.randint(0, groups, rows),
+        "A": rng.rand(rows),
+        "B": rng.randint(0, 100, rows)})
+
+def _best_ms(w, aggregates, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        w.summarize(aggregates, "G")
+        best = min(best, time.perf_counter() - t0)
+    return 1000 * best
+
+def _compare(w, aggregates, repeat):
+    vectorized = _best_ms(w, aggregates, repeat)
+
+    apply_aggregate = SimpleIfAgg.apply_aggregate
+    SimpleIfAgg.apply_aggregate = _apply_per_group
+    try:
+        per_group = _best_ms(w, aggregates, repeat)
+    finally:
+        SimpleIfAgg.apply_aggregate = apply_aggregate
+
+    return per_group, vectorized
+
+def main(rows=1000000, groups=(100, 1000, 10000), repeat=3):
+    # pandas warns about apply including the grouping columns
+    warnings.simplefilter("ignore")
+
+    print("{} rows, best of {} runs".format(rows, repeat))
+    for n in groups:
+        w = Wrap(_create_df(rows, n))
+        for aggregates in AGGREGATES:
+            per_group, vectorized = _compare(w, aggregates, repeat)
+            print("{:>6} groups  {:58} per group {:9.1f} ms  vectorized {:8.1f} ms  {:6.1f}x".format(
+                n, aggregates, per_group, vectorized, per_group / vectorized))
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    if len(args) > 1:
+        main(args[0], args[1:])
+    elif args:
+        main(args[0])
+    else:
+        main()
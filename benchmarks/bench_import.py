@@ -0,0 +1,69 @@
+"""
+Measure the cold start cost of kusto_pandas: importing the package and running the first query.
+
+Each measurement runs in a fresh interpreter so nothing is cached between runs.
+
+    python benchmarks/bench_import.py
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+_IMPORT = """
+import time
+t0 = time.perf_counter()
+import pandas
+t1 = time.perf_counter()
+import kusto_pandas
+t2 = time.perf_counter()
+print(t1 - t0, t2 - t1)
+"""
+
+_FIRST_QUERY = """
+import time
+import pandas as pd
+from kusto_pandas import Wrap
+w = Wrap(pd.DataFrame({"A": [1, 2, 3]}))
+t0 = time.perf_counter()
+w.execute("self | where A > 1 | take 1")
+t1 = time.perf_counter()
+print(t1 - t0)
+"""
+
+_GRAMMAR = """
+import time
+from kusto_pandas.expression_parser import compiled_grammar as cg
+import parsimonious
+text = cg.read_grammar_text()
+t0 = time.perf_counter()
+cg.compile_grammar(text)
+t1 = time.perf_counter()
+cg._load_compiled_grammar(text)
+t2 = time.perf_counter()
+print(t1 - t0, t2 - t1)
+"""
+
+def _run(code):
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=REPO_ROOT)
+    return [float(x) for x in output.split()]
+
+def _median_ms(runs, i):
+    return 1000 * statistics.median(r[i] for r in runs)
+
+def main(repeat=7):
+    imports = [_run(_IMPORT) for _ in range(repeat)]
+    first_queries = [_run(_FIRST_QUERY) for _ in range(repeat)]
+    grammars = [_run(_GRAMMAR) for _ in range(repeat)]
+
+    print("median of {} runs".format(repeat))
+    print("import pandas                 {:8.1f} ms".format(_median_ms(imports, 0)))
+    print("import kusto_pandas           {:8.1f} ms".format(_median_ms(imports, 1)))
+    print("first query                   {:8.1f} ms".format(_median_ms(first_queries, 0)))
+    print("compile grammar from .peg     {:8.1f} ms".format(_median_ms(grammars, 0)))
+    print("load compiled grammar         {:8.1f} ms".format(_median_ms(grammars, 1)))
+
+if __name__ == "__main__":
+    main()
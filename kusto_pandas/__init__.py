@@ -1 +1,2 @@
-from .kusto_pandas import Wrap
+from .kusto_pandas import Wrap, LazyWrap
+from .prepared_query import prepare, PreparedQuery
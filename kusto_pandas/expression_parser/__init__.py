@@ -1,7 +1,20 @@
-from .parsimonious_parser import parse_expression, parse_expression_tabular_operator, parse_expression_query
 from .expression_parser_types import Assignment, Method, Var, By, Comma, Star, Mul, Asc, Desc
 from .expression_tree import flatten_comma
 
 from ._simple_expression import SimpleExpression, _get_method_default_name, _generate_temp_column_name, replace_temp_column_names
 
-from .tabular_operators import Take, Extend, Where, TABLE_SELF
\ No newline at end of file
+from .tabular_operators import Take, Extend, Where, TABLE_SELF
+from .compiler import compile_expression, set_numexpr_enabled
+
+# The parser depends on parsimonious and a compiled grammar, which are only needed once a query is parsed.
+# Import it on first use to keep "import kusto_pandas" fast.
+_LAZY_PARSER_ATTRIBUTES = [
+    "parse_expression", "parse_expression_tabular_operator", "parse_expression_query",
+    "get_parse_cache", "clear_parse_cache", "set_parse_cache_size",
+    ]
+
+def __getattr__(name):
+    if name in _LAZY_PARSER_ATTRIBUTES:
+        from . import parsimonious_parser
+        return getattr(parsimonious_parser, name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
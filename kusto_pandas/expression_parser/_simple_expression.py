@@ -1,10 +1,11 @@
-import uuid
+import itertools
 from collections import OrderedDict
 
 _temp_name_base = "__tempcolumnname__"
 
 from .expression_parser import Assignment, Var, Method, By, Comma, Mul, Asc, Desc
 from .expression_tree import flatten_comma
+from .compiler import evaluate_compiled
 
 class DefaultColumnNameGenerator:
     def __init__(self):
@@ -31,11 +32,21 @@ class DefaultColumnNameGenerator:
             if self._is_temp_column_name(c):
                 new_name = self._generate_default_column_name(df.columns)
                 name_map[c] = new_name
+
+        if not name_map:
+            # rename would copy the data even if there is nothing to rename
+            return df
         
-        return df.rename(columns=name_map)
+        dfnew = df.copy(deep=False)
+        dfnew.columns = [name_map.get(c, c) for c in df.columns]
+        return dfnew
+
+# The temporary names only have to be unique within one operator.  The operators which create them replace them 
+# with Column1, Column2, ... before returning, so a counter is enough.  next() on a count is atomic, so it is thread safe
+_temp_column_numbers = itertools.count()
 
 def _generate_temp_column_name():
-    return _temp_name_base + str(uuid.uuid1())
+    return _temp_name_base + str(next(_temp_column_numbers))
 
 def replace_temp_column_names(df):
     name_generator = DefaultColumnNameGenerator()
@@ -71,7 +82,7 @@ class SimpleExpression:
         return _get_default_name(self.parsed)
 
     def evaluate(self, variable_map):
-        return self.expression.evaluate(variable_map)
+        return evaluate_compiled(self.expression, variable_map)
     
     def set_name(self, name):
         self.assignment_name = name
@@ -101,17 +112,6 @@ def _get_default_name(parsed):
         return _get_method_default_name(parsed)
     return _generate_temp_column_name()
 
-def _evaluate_and_get_name(parsed, variable_map):
-    result = parsed.evaluate(variable_map)
-    if isinstance(parsed, Assignment):
-        for name, value in result.items():
-            return name, value
-    if isinstance(parsed, Var):
-        return str(parsed), result
-    if isinstance(parsed, Method):
-        return _get_method_default_name(parsed), result
-    return _generate_temp_column_name(), result
-
 def remove_duplicates_maintain_order(list_with_duplicates):
     return list(OrderedDict.fromkeys(list_with_duplicates))
 
@@ -6,6 +6,7 @@ import numpy as np
 from . import expression_parser as ep
 
 from ._simple_expression import _generate_temp_column_name
+from .compiler import evaluate_compiled
 
 def _is_groupby(g):
     return isinstance(g, pd.core.groupby.SeriesGroupBy) or isinstance(g, pd.core.groupby.DataFrameGroupBy )
@@ -31,57 +32,64 @@ class TopLevelAgg:
         self.new_colum_name = new_column_name
         self.parsed = parsed
         self.all_columns = all_columns
-        self.aggregate_instances = []
+        # the aggregate instances, keyed by the Method node in the parsed expression which they implement.
+        # This is per execution state, so it is kept here rather than on the (shared) parsed expression
+        self.aggregate_instances = dict()
     
-    def _evaluate_column_inputs_traverse(self, vars, parsed):
+    def _get_column_inputs_traverse(self, parsed):
         """
-        Traverse the expression tree to find the aggregate methods.  Once we find one, evaluate the 
-        expressions that are arguments to that method.  Return those evaluated arguments as a list.
+        Traverse the expression tree to find the aggregate methods.  Return the names and definitions of the 
+        columns which are the inputs to those methods
         """
         if isinstance(parsed, ep.Method) and str(parsed.name) in aggregate_map:
             aggregate_class = aggregate_map[str(parsed.name)]
-            # here we instantiate the instance of the aggrege method class.
-            # We attach that to the parsed object for later use because we will need to call it again.
-            # This is an inelegant solution, I should find a cleaner one.
+            # here we instantiate the instance of the aggregate method class.
+            # We keep it for later use because we will need to call it again after the groupby
             aggregate_instance = aggregate_class(parsed.args.args, self.all_columns)
-            parsed.set_aggregate_instance(aggregate_instance)
-            self.aggregate_instances.append(aggregate_instance)
-            return aggregate_instance.evaluate_column_inputs(vars)
+            self.aggregate_instances[parsed] = aggregate_instance
+            return aggregate_instance.get_column_inputs()
 
-        list_of_lists = [self._evaluate_column_inputs_traverse(vars, d) for d in parsed.descendents]
+        list_of_lists = [self._get_column_inputs_traverse(d) for d in parsed.descendents]
         # flatten lists
         return list(itertools.chain.from_iterable(list_of_lists))
 
+    def get_column_inputs(self):
+        return self._get_column_inputs_traverse(self.parsed)
+
     def evaluate_column_inputs(self, vars):
-        return self._evaluate_column_inputs_traverse(vars, self.parsed)
+        return [(name, evaluate_compiled(definition, vars)) for name, definition in self.get_column_inputs()]
 
     def _get_output_names(self):
         if self.new_colum_name is not None:
             return [self.new_colum_name]
         
-        if isinstance(self.parsed, ep.Method) and self.parsed.has_aggregate_instance():
-            return self.parsed.aggregate_instance.get_output_column_names()
+        if self.parsed in self.aggregate_instances:
+            return self.aggregate_instances[self.parsed].get_output_column_names()
         
         return [_generate_temp_column_name()]
     
-    def apply(self, grouped, vars):
+    def apply(self, grouped, vars, reduced=None):
         """
         Evaluate the aggregate expression.  Most aggregates output exactly one series, 
         but some, e.g. percentiles(A, 90, 95) can output multiple series
 
+        reduced holds the results of the aggregates which were already computed by reduce_together
         """
+        if reduced is None:
+            reduced = dict()
+
         # In this method we will do several things.  
         # 1. evaluate the aggregate method on the precomputed columns in the groupby 
         # 2. Evaluate any mathematical expressions operating on the output of the aggregate method
         # 3. Assign names to the output columns
         #
-        # For 2. we will use self.parsed.evaluate(vars) which does not allow us to pass down the groupby object.
-        # To work around this we will attache the groupby object to the aggregate method instances
-        for agg in self.aggregate_instances:
-            agg.set_grouped_object(grouped)
+        # For 2. we will evaluate self.parsed, which does not allow us to pass down the groupby object.
+        # To work around this we evaluate the aggregates first and pass the results down in an AggregateScope
+        aggregate_results = dict((method, reduced[agg] if agg in reduced else agg.apply(grouped)) 
+            for method, agg in self.aggregate_instances.items())
 
         # result can be a Series or a list of Series (E.g. percentiles returns a list of Series)
-        result = self.parsed.evaluate(vars)
+        result = evaluate_compiled(self.parsed, ep.AggregateScope(vars, aggregate_results))
 
         output_names = self._get_output_names()
 
@@ -97,9 +105,12 @@ class TopLevelAgg:
 class SimpleAgg:
     """
     """
+    # The name of the groupby method which computes this aggregate from its only input column, if there is one.
+    # Aggregates with the same reducer are computed together by reduce_together
+    reducer = None
+
     def __init__(self, args, all_columns):
         self.args = args
-        self._grouped_val = None
 
         # Get the definitions of the columns needed for the aggregate.
         # Each entry can be a simple column name, or a more complex expression, e.g. A+B.
@@ -121,11 +132,13 @@ class SimpleAgg:
         """
         return self.args
 
-    def evaluate_column_inputs(self, vars):
+    def get_column_inputs(self):
         self.validate()
 
-        input_cols = [col.evaluate(vars) for col in self.input_column_definitions]
-        return zip(self.input_column_names, input_cols)
+        return list(zip(self.input_column_names, self.input_column_definitions))
+
+    def evaluate_column_inputs(self, vars):
+        return [(name, evaluate_compiled(definition, vars)) for name, definition in self.get_column_inputs()]
 
     def _get_method_name(self):
         return self.__class__.__name__.lower()
@@ -141,12 +154,6 @@ class SimpleAgg:
         suffix = "_".join(names)
         return [self._get_method_name() + "_" + suffix]
     
-    def set_grouped_object(self, grouped):
-        self._grouped_val = grouped
-
-    def evaluate(self, vals):
-        return self.apply(self._grouped_val)
-
     def apply(self, grouped):
         if len(self.input_column_names) == 1:
             # operate on a SeriesGroupBy
@@ -190,22 +197,74 @@ class AggTwoArgs(SimpleAgg):
         if len(self.args) != 2:
             raise Exception("{0} must have two arguments: {1}".format(self._get_method_name(), str(self.args)))
 
+def _predicate_mask(predicate):
+    # a null predicate does not select the row
+    return predicate.fillna(False).astype(bool).to_numpy()
+
+def _group_codes(grouped):
+    """
+    The number of the group of each row in grouped.  Rows with a null group key are not part of any group, and 
+    are numbered -1.  (Depending on the version of pandas, ngroup numbers them NaN or -1)
+    """
+    return grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+
+def _reindex_groups(result, groups):
+    """
+    result is indexed by the group numbers of the groups which it has a value for.  Return it indexed by 
+    all of the groups, with the missing groups set to null.  None for an object column, otherwise NaN
+    """
+    present = np.zeros(len(groups), dtype=bool)
+    present[result.index.to_numpy(dtype=np.int64)] = True
+    result = result.reindex(range(len(groups)))
+    result.index = groups
+    if result.dtype == object and not present.all():
+        result[~present] = None
+    return result
+
 class SimpleIfAgg(AggTwoArgs):
     def apply_aggregate(self, grouped):
-        series = grouped.apply(self.apply_aggregate_series)
-        return series
+        """
+        Rather than calling a Python function on each group, drop the rows where the predicate is false and 
+        aggregate the rest with the vectorized groupby methods.  The remaining rows are grouped by their 
+        group number in grouped, so the group keys are not hashed again.
+        """
+        df = grouped.obj
+        groups = grouped.size().index
+        codes = _group_codes(grouped)
+
+        mask = _predicate_mask(df[self.input_column_names[1]]) & (codes >= 0)
+        values = df[self.input_column_names[0]][mask]
+
+        result = self._apply_aggregate_groups(values, codes[mask])
+        return _reindex_groups(result, groups)
+
+    def _apply_aggregate_groups(self, values, codes):
+        """
+        Aggregate the values of each group.  Return a Series indexed by the group numbers (codes)
+        """
+        grouped_values = values.groupby(codes, sort=False)
+        try:
+            return self._apply_aggregate_values(grouped_values)
+        except TypeError:
+            # some aggregates are only implemented for a Series, e.g. the std of datetimes
+            return grouped_values.apply(self._apply_aggregate_values)
     
     def apply_aggregate_series(self, df):
-        predicate = df[self.input_column_names[1]]
-        series = df[self.input_column_names[0]].loc[predicate]
+        predicate = _predicate_mask(df[self.input_column_names[1]])
+        series = df[self.input_column_names[0]][predicate]
         if len(series) == 0:
             return None
-        return self._apply_aggregate_series(series)
+        return self._apply_aggregate_values(series)
     
-    def _apply_aggregate_series(self, series):
+    def _apply_aggregate_values(self, values):
+        """
+        Aggregate the values where the predicate is true.  values is a Series, or a SeriesGroupBy of them
+        """
         raise NotImplementedError()
 
 class Count(NoArgAgg):
+    reducer = "size"
+
     def apply_aggregate(self, grouped):
         return grouped.size()
 
@@ -214,88 +273,184 @@ class Count(NoArgAgg):
         return series.shape[0]
     
 class CountIf(AggOneArg):
+    reducer = "sum"
+
     def apply_aggregate(self, grouped):
         # the countif predicate was precomputed into a new column
         # sum returns the number of true values in that column
         return grouped.sum()
 
 class DCount(AggOneArg):
+    reducer = "nunique"
+
     def apply_aggregate(self, grouped):
         return grouped.nunique()
 
 class DCountIf(SimpleIfAgg):
-    def _apply_aggregate_series(self, series):
-        return series.nunique()
+    def _apply_aggregate_values(self, values):
+        return values.nunique()
 
 class Sum(AggOneArg):
+    reducer = "sum"
+
     def apply_aggregate(self, grouped):
         return grouped.sum()
 
 class SumIf(SimpleIfAgg):
-    def _apply_aggregate_series(self, series):
-        return series.sum()
+    def _apply_aggregate_values(self, values):
+        return values.sum()
 
 class Avg(AggOneArg):
+    reducer = "mean"
+
     def apply_aggregate(self, grouped):
         return grouped.mean()
 
 class AvgIf(SimpleIfAgg):
-    def _apply_aggregate_series(self, series):
-        return series.mean()
+    def _apply_aggregate_values(self, values):
+        return values.mean()
 
 class StDev(AggOneArg):
+    reducer = "std"
+
     def apply_aggregate(self, grouped):
         return grouped.std()
 
 class StDevIf(SimpleIfAgg):
-    def _apply_aggregate_series(self, series):
-        return series.std()
+    def _apply_aggregate_values(self, values):
+        return values.std()
 
 class Variance(AggOneArg):
+    reducer = "var"
+
     def apply_aggregate(self, grouped):
         return grouped.var()
 
 class VarianceIf(SimpleIfAgg):
-    def _apply_aggregate_series(self, series):
-        return series.var()
+    def _apply_aggregate_values(self, values):
+        return values.var()
 
 class Min(AggOneArg):
+    reducer = "min"
+
     def apply_aggregate(self, grouped):
         return grouped.min()
 
 class MinIf(SimpleIfAgg):
-    def _apply_aggregate_series(self, series):
-        return series.min()
+    def _apply_aggregate_values(self, values):
+        return values.min()
 
 class Max(AggOneArg):
+    reducer = "max"
+
     def apply_aggregate(self, grouped):
         return grouped.max()
 
 class MaxIf(SimpleIfAgg):
-    def _apply_aggregate_series(self, series):
-        return series.max()
+    def _apply_aggregate_values(self, values):
+        return values.max()
 
-class ArgMin(AggTwoArgs):
-    def apply_aggregate(self, grouped):
-        series = grouped.apply(self.apply_aggregate_series)
-        return series
-    
-    def apply_aggregate_series(self, series):
-        # find the index of the min of arg0
-        idx = series[self.input_column_names[0]].idxmin()
-        # return the value of arg1 at that index
-        return series[self.input_column_names[1]].loc[idx]
+def _arg_extreme_rows(values, codes, extreme):
+    """
+    Find the first row of each group where values is the min or max (extreme) of the group.  
+    Return the positions of those rows, and the group numbers they belong to.  Groups where all of the values
+    are null have no such row
+    """
+    positions = np.flatnonzero(codes >= 0)
+    values = values.iloc[positions]
+    codes = codes[positions]
 
-class ArgMax(AggTwoArgs):
-    def apply_aggregate(self, grouped):
-        series = grouped.apply(self.apply_aggregate_series)
-        return series
-    
-    def apply_aggregate_series(self, series):
-        # find the index of the max of arg0
-        idx = series[self.input_column_names[0]].idxmax()
-        # return the value of arg1 at that index
-        return series[self.input_column_names[1]].loc[idx]
+    group_extreme = values.groupby(codes, sort=False).transform(extreme)
+    is_extreme = (values.to_numpy() == group_extreme.to_numpy())
+    positions = positions[is_extreme]
+
+    # the positions are in ascending order, so return_index gives the first extreme row of each group
+    row_codes, first = np.unique(codes[is_extreme], return_index=True)
+    return positions[first], row_codes
+
+class ArgAgg(SimpleAgg):
+    """
+    The values of the other args in the row where the first arg is smallest (min) or largest (max). 
+    The rows are found with vectorized groupby methods, and the values are gathered by position
+    """
+    extreme = None
+
+    def apply(self, grouped):
+        if _is_groupby(grouped):
+            df = grouped.obj
+            codes = _group_codes(grouped)
+            groups = grouped.size().index
+        else:
+            # the aggregate is over the entire DataFrame, as a single group
+            df = grouped
+            codes = np.zeros(len(df), dtype=np.int64)
+            groups = pd.RangeIndex(1)
+
+        rows, row_codes = _arg_extreme_rows(df[self.input_column_names[0]], codes, self.extreme)
+
+        result = []
+        for col_name in self._get_selected_column_names():
+            selected = df[col_name].take(rows)
+            selected.index = row_codes
+            result.append(_reindex_groups(selected, groups))
+
+        if len(result) == 1:
+            return result[0]
+
+        return result
+
+    def _get_selected_column_names(self):
+        return self.input_column_names[1:]
+
+class ArgMin(ArgAgg, AggTwoArgs):
+    extreme = "min"
+
+class ArgMax(ArgAgg, AggTwoArgs):
+    extreme = "max"
+
+class KustoArgAgg(ArgAgg):
+    """
+    The Kusto forms arg_min(A, B, C, ...) and arg_max(A, *), which return the row where A is smallest or largest.
+    The output columns are A followed by the selected columns, with their own names.  * selects all of the
+    columns except the group by columns
+    """
+    def validate(self):
+        if len(self.args) < 2:
+            raise Exception("{0} must have at least two arguments: {1}".format(self._get_method_name(), str(self.args)))
+
+    def _get_input_column_definitions(self, all_columns):
+        if len(self.args) == 0:
+            # validate will raise
+            return self.args
+
+        definitions = self.args[:1]
+        names = [self._get_arg_name_or_default(self.args[0], None)]
+        for arg in self.args[1:]:
+            if isinstance(arg, ep.Star):
+                expanded = [ep.Var(c) for c in all_columns]
+            else:
+                expanded = [arg]
+
+            for definition in expanded:
+                name = self._get_arg_name_or_default(definition, None)
+                if name is not None and name in names:
+                    continue
+                names.append(name)
+                definitions.append(definition)
+
+        return definitions
+
+    def _get_selected_column_names(self):
+        return self.input_column_names
+
+    def get_output_column_names(self):
+        return list(self.input_column_names)
+
+class Arg_Min(KustoArgAgg):
+    extreme = "min"
+
+class Arg_Max(KustoArgAgg):
+    extreme = "max"
 
 def _all_non_null_if_possible_mask(s, mask):
     if mask is None:
@@ -367,7 +522,10 @@ class Any(SimpleAgg):
         return result
 
 class AnyIf(SimpleIfAgg):
-    def _apply_aggregate_series(self, series):
+    def _apply_aggregate_values(self, series):
+        if _is_groupby(series):
+            # first skips the nulls, as _all_non_null_if_possible_mask does
+            return series.first()
         mask = _all_non_null_if_possible_mask(series, None)
         s = series.loc[mask]
         return s.iloc[0]
@@ -421,63 +579,237 @@ class Percentiles(SimpleAgg):
 
         return flattened
 
-class Make_Set(AggOneArg):
-    def apply_aggregate(self, grouped):
-        series = grouped.apply(self.apply_aggregate_series)
-        return series
-    
-    def apply_aggregate_series(self, series):
-        # should I convert this to a json set first?
-        return set(series)
+def _split_groups(values, codes, max_size=None):
+    """
+    Collect the values of each group into a list, in the order of the rows.  Rows with code -1 are left out.
+    Return the group numbers which have values, and their lists.
 
-class Make_Set_If(SimpleIfAgg):
-    def _apply_aggregate_series(self, series):
-        return set(series)
+    The rows are sorted by group number with one stable sort, and the sorted values are sliced at the group 
+    boundaries, rather than calling a Python function for each group.  Only the first max_size rows of each group 
+    are converted to Python objects
+    """
+    positions = np.flatnonzero(codes >= 0)
+    order = positions[np.argsort(codes[positions], kind="stable")]
+    sorted_codes = codes[order]
+    if len(sorted_codes) == 0:
+        return sorted_codes, []
+
+    starts = np.flatnonzero(np.concatenate([[True], sorted_codes[1:] != sorted_codes[:-1]]))
+    counts = np.diff(np.append(starts, len(sorted_codes)))
+    group_codes = sorted_codes[starts]
+
+    if max_size is not None:
+        rank = np.arange(len(order)) - np.repeat(starts, counts)
+        order = order[rank < max_size]
+        counts = np.minimum(counts, max_size)
+
+    ends = np.cumsum(counts)
+    # tolist gives the same Python objects as iterating over the Series, e.g. Timestamps for a datetime column
+    sorted_values = values.take(order).tolist()
+    return group_codes, [sorted_values[start:end] for start, end in zip(ends - counts, ends)]
+
+def _first_of_each_value(values, codes):
+    """
+    Return codes, with -1 for the rows whose value already appeared in an earlier row of the same group
+    """
+    try:
+        duplicated = pd.DataFrame(dict(code=codes, value=values.to_numpy())).duplicated().to_numpy()
+    except TypeError:
+        # unhashable values, e.g. dictionaries.  These can't be put in a set anyway
+        return codes
+    return np.where(duplicated, -1, codes)
+
+def _bag(values, max_size=None):
+    bag = dict()
+    for s in values:
+        try: 
+            items = s.items()
+        except:
+            # skip the item if it is not a dictionary type
+            continue
+
+        for k, v in items:
+            if max_size is not None and len(bag) >= max_size and k not in bag:
+                continue
+            # overwrite old values
+            bag[k] = v
+    return bag
 
-class Make_List(AggOneArg):
-    def apply_aggregate(self, grouped):
-        series = grouped.apply(self.apply_aggregate_series)
-        return series
-    
-    def apply_aggregate_series(self, series):
-        # should I convert this to a json set first?
-        return list(series)
+def make_lists(values, codes, max_size=None):
+    """
+    The list of the values of each group.  Return a Series indexed by the group numbers (codes)
+    """
+    group_codes, lists = _split_groups(values, codes, max_size)
+    return pd.Series(lists, index=group_codes, dtype=object)
+
+def make_sets(values, codes, max_size=None):
+    """
+    The set of the values of each group.  Return a Series indexed by the group numbers (codes)
+    """
+    if max_size is not None:
+        # so that the first max_size distinct values are kept
+        codes = _first_of_each_value(values, codes)
+    group_codes, lists = _split_groups(values, codes, max_size)
+    return pd.Series([set(l) for l in lists], index=group_codes, dtype=object)
+
+def make_bags(values, codes, max_size=None):
+    """
+    The dictionaries of each group merged into one, where later keys overwrite earlier ones, with at most 
+    max_size keys.  Return a Series indexed by the group numbers (codes)
+    """
+    group_codes, lists = _split_groups(values, codes)
+    return pd.Series([_bag(l, max_size) for l in lists], index=group_codes, dtype=object)
+
+class MakeAgg(SimpleAgg):
+    """
+    make_list(A [, maxSize]), make_set(A [, maxSize]) and make_bag(A [, maxSize]).  maxSize limits the number of 
+    elements in the output of each group
+    """
+    # the number of arguments before maxSize
+    num_value_args = 1
+    # make_lists, make_sets or make_bags
+    make = None
+    # the output for no rows
+    empty = None
+
+    def validate(self):
+        if len(self.args) not in (self.num_value_args, self.num_value_args + 1):
+            raise Exception("{0} takes {1} argument(s) and an optional maxSize: {2}".format(
+                self._get_method_name(), self.num_value_args, str(self.args)))
+
+    def _get_input_column_definitions(self, all_columns):
+        return self.args[:self.num_value_args]
+
+    def _get_max_size(self):
+        if len(self.args) <= self.num_value_args:
+            return None
+
+        max_size = int(self.args[self.num_value_args].evaluate(None))
+        if max_size < 0:
+            raise Exception("maxSize can't be negative: " + str(max_size))
+        return max_size
 
-class Make_List_If(SimpleIfAgg):
-    def _apply_aggregate_series(self, series):
-        return list(series)
+    def _make_groups(self, values, codes):
+        return self.make(values, codes, self._get_max_size())
 
-class Camoflage:
-    def __init__(self, value):
-        self.value = value
+    def _make_series(self, series):
+        result = self._make_groups(series, np.zeros(len(series), dtype=np.int64))
+        if len(result) == 0:
+            return self.empty()
+        return result.iloc[0]
 
-class Make_Bag(AggOneArg):
     def apply_aggregate(self, grouped):
-        camo_series = grouped.apply(lambda x: self.apply_aggregate_series(x, leave_as_dict=False))
-        series = camo_series.apply(lambda x: x.value)
-        return series
-    
-    def apply_aggregate_series(self, series, leave_as_dict=True):
-        # should I convert this to a json set first?
-        bag = dict()
-        for s in series:
-            try: 
-                items = s.items()
-            except:
-                # skip the item if it is not a dictionary type
+        result = self._make_groups(grouped.obj, _group_codes(grouped))
+        return _reindex_groups(result, grouped.size().index)
+
+    def apply_aggregate_series(self, series):
+        return self._make_series(series)
+
+class MakeIfAgg(MakeAgg, SimpleIfAgg):
+    """
+    make_list_if(A, predicate [, maxSize]) and make_set_if(A, predicate [, maxSize]).  
+    SimpleIfAgg selects the rows where the predicate is true, and MakeAgg collects their values
+    """
+    num_value_args = 2
+
+    apply_aggregate = SimpleIfAgg.apply_aggregate
+    apply_aggregate_series = SimpleIfAgg.apply_aggregate_series
+
+    def _apply_aggregate_groups(self, values, codes):
+        return self._make_groups(values, codes)
+
+    def _apply_aggregate_values(self, values):
+        return self._make_series(values)
+
+class Make_Set(MakeAgg):
+    make = staticmethod(make_sets)
+    empty = set
+
+class Make_Set_If(MakeIfAgg):
+    make = staticmethod(make_sets)
+    empty = set
+
+class Make_List(MakeAgg):
+    make = staticmethod(make_lists)
+    empty = list
+
+class Make_List_If(MakeIfAgg):
+    make = staticmethod(make_lists)
+    empty = list
+
+class Make_Bag(MakeAgg):
+    make = staticmethod(make_bags)
+    empty = dict
+
+# The column dtypes which each reducer can compute for several columns at once, giving the same result as 
+# computing them one column at a time.  Columns of other dtypes are aggregated separately
+_reducer_kinds = dict(
+    sum="biuf",
+    mean="biuf",
+    std="biuf",
+    var="biuf",
+    min="biufmM",
+    max="biufmM",
+    nunique=None,
+)
+
+def _can_reduce_together(reducer, series):
+    kinds = _reducer_kinds[reducer]
+    if kinds is None:
+        return True
+    return isinstance(series.dtype, np.dtype) and series.dtype.kind in kinds
+
+def reduce_together(args, grouped, group_by_col_names):
+    """
+    Compute the aggregates of args (TopLevelAggs) which have a reducer.  Each reducer is called once on all of 
+    the columns it aggregates, rather than once per aggregate, so e.g. sum(A), sum(B) and countif(A > 1) are
+    summed in one pass over the groups.
+
+    Return a dictionary from the aggregate instance to its result
+    """
+    reduced = dict()
+    if not _is_groupby(grouped):
+        return reduced
+
+    # the input column names for each reducer, and the aggregates which will read from its result
+    columns = dict()
+    planned = []
+    for arg in args:
+        for agg in arg.aggregate_instances.values():
+            if agg.reducer is None:
+                continue
+            if agg.reducer == "size":
+                planned.append(agg)
                 continue
 
-            for k, v in items:
-                # overwrite old values
-                bag[k] = v
+            col_name = agg.input_column_names[0]
+            if col_name in group_by_col_names or not _can_reduce_together(agg.reducer, grouped.obj[col_name]):
+                continue
 
-        if leave_as_dict:
-            return bag
+            reducer_columns = columns.setdefault(agg.reducer, [])
+            if col_name not in reducer_columns:
+                reducer_columns.append(col_name)
+            planned.append(agg)
+
+    # Reducers on the same columns share the selection, which copies the columns into one block the first time
+    # it is aggregated
+    selections = dict()
+    results = dict()
+    for reducer, col_names in columns.items():
+        key = tuple(sorted(col_names))
+        if key not in selections:
+            selections[key] = grouped[list(key)]
+        results[reducer] = getattr(selections[key], reducer)()
+
+    for agg in planned:
+        if agg.reducer == "size":
+            if "size" not in results:
+                results["size"] = grouped.size()
+            reduced[agg] = results["size"]
+        else:
+            reduced[agg] = results[agg.reducer][agg.input_column_names[0]]
 
-        # If I return a dict here then the internals of pandas disassemble the dict 
-        # and turn it into a multi-index Series.  
-        # A simple workaround is to camoflage it as something else and then extract it later
-        return Camoflage(bag)
+    return reduced
 
 def get_method_name(type):
     return type.__name__.lower()
@@ -485,7 +817,7 @@ def get_method_name(type):
 aggregate_methods = [Count, DCount, DCountIf, CountIf, 
                      Sum, SumIf, Avg, AvgIf, StDev, StDevIf, Variance, VarianceIf, 
                      Min, MinIf, Max, MaxIf,
-                     ArgMin, ArgMax, Any, AnyIf, Percentiles,
+                     ArgMin, ArgMax, Arg_Min, Arg_Max, Any, AnyIf, Percentiles,
                      Make_Set, Make_Set_If, Make_List, Make_List_If, Make_Bag
                      ]
 
@@ -0,0 +1,62 @@
+"""
+Compiling kusto_grammar.peg into a parsimonious Grammar takes longer than parsing and running a typical query,
+so a compiled copy of the grammar is shipped next to it in kusto_grammar.pickle.
+
+The compiled copy is only used if it was built from the current contents of kusto_grammar.peg
+and it can be loaded by the installed version of parsimonious.  Otherwise we fall back to compiling the grammar.
+
+After changing the grammar, regenerate the compiled copy with
+
+    python -m kusto_pandas.expression_parser.compiled_grammar
+"""
+import hashlib
+import os
+import pickle
+
+_HERE = os.path.dirname(__file__)
+GRAMMAR_FILE = os.path.join(_HERE, "kusto_grammar.peg")
+COMPILED_GRAMMAR_FILE = os.path.join(_HERE, "kusto_grammar.pickle")
+
+def read_grammar_text():
+    with open(GRAMMAR_FILE) as fin:
+        return fin.read()
+
+def _grammar_hash(grammar_text):
+    return hashlib.sha256(grammar_text.encode("utf-8")).hexdigest()
+
+def compile_grammar(grammar_text):
+    from parsimonious.grammar import Grammar
+    return Grammar(grammar_text)
+
+def _load_compiled_grammar(grammar_text):
+    from parsimonious.grammar import Grammar
+    try:
+        with open(COMPILED_GRAMMAR_FILE, "rb") as fin:
+            saved_hash, grammar = pickle.load(fin)
+    except Exception:
+        # missing file, or it was pickled with an incompatible version of parsimonious
+        return None
+
+    if saved_hash != _grammar_hash(grammar_text) or not isinstance(grammar, Grammar):
+        return None
+    return grammar
+
+def load_grammar():
+    """
+    Return the compiled Grammar, using the shipped compiled copy if it is up to date
+    """
+    grammar_text = read_grammar_text()
+    grammar = _load_compiled_grammar(grammar_text)
+    if grammar is None:
+        grammar = compile_grammar(grammar_text)
+    return grammar
+
+def write_compiled_grammar(path=COMPILED_GRAMMAR_FILE):
+    grammar_text = read_grammar_text()
+    grammar = compile_grammar(grammar_text)
+    with open(path, "wb") as fout:
+        pickle.dump((_grammar_hash(grammar_text), grammar), fout, protocol=4)
+
+if __name__ == "__main__":
+    write_compiled_grammar()
+    print("wrote " + COMPILED_GRAMMAR_FILE)
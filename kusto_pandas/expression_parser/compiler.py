@@ -0,0 +1,545 @@
+"""
+Compile a parsed expression tree into a chain of closures.
+
+Expression.evaluate walks the tree on every call, and every node goes through the generic evaluate of its base
+class before it reaches the method that does the work.  The compiled form makes those decisions once: each node
+becomes a closure which calls the closures of its children and then the kernel for its operator directly.
+Literal operands are bound into the closure of the node which uses them.
+
+The compiled closure of a node is cached, so a query that is run again (the parsed trees are cached too) doesn't
+compile it again.  The parsed trees are shared between executions and threads, and the optimizer copies nodes, so the
+cache is kept here rather than on the nodes.  It is keyed weakly, so the closures only hold weak references to nodes.
+
+If numexpr is installed, arithmetic and comparisons on numeric columns, e.g. (A * 2 + B) / C > D and E < 5, are 
+evaluated by numexpr in one pass without a temporary Series for every operator.  Anything numexpr can't evaluate 
+falls back to the closures.
+"""
+import operator
+import types
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from . import expression_parser_types as ept
+
+# The kernels of the operators which map directly to a python operator
+_operator_kernels = {
+    ept.Add: operator.add,
+    ept.Sub: operator.sub,
+    ept.Mul: operator.mul,
+    ept.Div: operator.truediv,
+    ept.Eq: operator.eq,
+    ept.NEq: operator.ne,
+    ept.Gt: operator.gt,
+    ept.Lt: operator.lt,
+    ept.Ge: operator.ge,
+    ept.Le: operator.le,
+    ept.UnaryMinus: operator.neg,
+}
+
+_compiled = weakref.WeakKeyDictionary()
+_compiled_expressions = weakref.WeakKeyDictionary()
+_compiled_groups = weakref.WeakKeyDictionary()
+
+# The operators numexpr evaluates with the same result as pandas
+_numexpr_binary_operators = {
+    ept.Add: "+",
+    ept.Sub: "-",
+    ept.Mul: "*",
+    ept.Div: "/",
+    ept.Eq: "==",
+    ept.NEq: "!=",
+    ept.Gt: ">",
+    ept.Lt: "<",
+    ept.Ge: ">=",
+    ept.Le: "<=",
+    ept.And: "&",
+    ept.Or: "|",
+}
+
+_numexpr_unary_operators = {
+    ept.UnaryMinus: "-",
+    ept.UnaryNot: "~",
+}
+
+_numexpr_enabled = True
+_numexpr = None
+
+def set_numexpr_enabled(enabled):
+    """
+    Evaluate numeric expressions with numexpr if it is installed.  It is enabled by default
+    """
+    global _numexpr_enabled
+    _numexpr_enabled = enabled
+
+def _get_numexpr():
+    global _numexpr
+    if _numexpr is None:
+        try:
+            import numexpr
+            _numexpr = numexpr
+        except ImportError:
+            _numexpr = False
+    return _numexpr
+
+_missing = object()
+
+def _compile_node(node):
+    compiled = _compiled.get(node)
+    if compiled is None:
+        compiled = _compile(node, _compile_node)
+        # two threads may both compile the node.  They get equivalent closures, so it doesn't matter which one is kept
+        _compiled[node] = compiled
+    return compiled
+
+def compile_expression(expression):
+    """
+    return a function of the variables (e.g. a Scope) which returns the same value as expression.evaluate
+    """
+    compiled = _compiled_expressions.get(expression)
+    if compiled is None:
+        compiled = _compile_with_shared_subexpressions([expression])[0]
+        _compiled_expressions[expression] = compiled
+    return compiled
+
+def compile_expressions(expressions):
+    """
+    compile expressions which are evaluated with the same variables, e.g. the arguments of an extend.
+    A subexpression which occurs more than once, e.g. A / B in extend x = A / B + 1, y = max_of(A / B, C), is evaluated once.
+    return the list of compiled expressions
+    """
+    if not expressions:
+        return []
+    # the group is cached with its first expression, and only weak references to the others
+    cached = _compiled_groups.get(expressions[0])
+    if cached is not None:
+        refs, compiled = cached
+        if len(refs) == len(expressions) and all(r() is e for r, e in zip(refs, expressions)):
+            return compiled
+
+    compiled = _compile_with_shared_subexpressions(expressions)
+    _compiled_groups[expressions[0]] = ([weakref.ref(e) for e in expressions], compiled)
+    return compiled
+
+def evaluate_compiled(expression, vals):
+    return compile_expression(expression)(vals)
+
+def expression_key(node, keys=None):
+    """
+    A key which is equal for expressions with the same structure, e.g. for each A / B in the expression A / B + max_of(A / B, C).
+    If keys is a dictionary, the keys of node and all of its descendents are stored in it by id.
+
+    The string of an expression is almost such a key, but a quoted column name can look like an expression, e.g. ['(A / B)']
+    """
+    if keys is None:
+        keys = dict()
+    return _expression_keys(node, keys)
+
+def _expression_keys(node, keys):
+    # store the key of node and of each of its descendents, by id, in keys
+    descendents = getattr(node, "descendents", None)
+    if descendents:
+        key = (type(node),) + tuple(_expression_keys(d, keys) for d in descendents)
+    else:
+        key = (type(node), repr(node))
+    keys[id(node)] = key
+    return key
+
+# The expressions which are worth evaluating only once.  Not e.g. variables, which are just a lookup
+_shareable_types = (ept.Opp, ept.UnaryOpp, ept.Method, ept.SquareBrackets)
+_unshareable_types = (ept.Assignment, ept.Comma, ept.DotDot, ept.By)
+
+def _find_shared_subexpressions(expressions, keys):
+    """
+    return the keys of the subexpressions which occur more than once.  The descendents of a repeated subexpression 
+    only count once, because it is only evaluated once
+    """
+    counts = dict()
+    stack = list(reversed(expressions))
+    while stack:
+        node = stack.pop()
+        key = keys[id(node)]
+        counts[key] = counts.get(key, 0) + 1
+        if counts[key] == 1:
+            stack.extend(reversed(getattr(node, "descendents", [])))
+    return set(key for key, count in counts.items() if count > 1)
+
+def _compile_with_shared_subexpressions(expressions):
+    keys = dict()
+    for e in expressions:
+        _expression_keys(e, keys)
+    shared = set(key for key in _find_shared_subexpressions(expressions, keys) if _is_shareable_type(key[0]))
+
+    if not shared:
+        return [_compile_node(e) for e in expressions]
+
+    compiled_shared = dict()
+    def compile_child(node):
+        key = keys.get(id(node))
+        if key not in shared or _is_constant(node):
+            return _compile(node, compile_child)
+        if key not in compiled_shared:
+            compiled_shared[key] = _compile_shared(key, _compile(node, compile_child))
+        return compiled_shared[key]
+
+    return [compile_child(e) for e in expressions]
+
+def is_shareable(node):
+    """
+    True if node is an expression worth evaluating only once, e.g. A / B but not A
+    """
+    return _is_shareable_type(type(node))
+
+def _is_shareable_type(node_type):
+    return issubclass(node_type, _shareable_types) and not issubclass(node_type, _unshareable_types)
+
+def _compile_shared(key, compiled):
+    """
+    The results of shared subexpressions are kept by the variables they were evaluated with, e.g. the Scope of an operator
+    """
+    def shared(vals):
+        results = getattr(vals, "shared_results", None)
+        if results is None:
+            return compiled(vals)
+        result = results.get(key, _missing)
+        if result is _missing:
+            result = results[key] = compiled(vals)
+        return result
+    return shared
+
+def _weak_method(node, function):
+    # a method of node which doesn't keep node alive
+    return types.MethodType(function, weakref.proxy(node))
+
+def _get_kernel(node):
+    kernel = _operator_kernels.get(type(node))
+    if kernel is not None:
+        return kernel
+    # the operators with more logic, e.g. contains or and, use the method of the node
+    return _weak_method(node, type(node).evaluate_internal)
+
+# The expressions which have a constant value if their descendents do
+_foldable_types = (ept.Opp, ept.UnaryOpp, ept.UnaryOppLeft, ept.ListExpression, ept.SquareBrackets)
+
+def _is_constant(node):
+    """
+    True if the value of node doesn't depend on the variables, e.g. 1d * 7 or ("a", "b").  
+    Methods are never constant, because a column or let variable can replace them
+    """
+    evaluate = getattr(type(node), "evaluate", None)
+    if evaluate in (ept.ExplicitLiteral.evaluate, ept.StringLiteral.evaluate):
+        return True
+    if isinstance(node, ept.Dot):
+        return _is_constant(node.left)
+    if isinstance(node, _foldable_types) and not isinstance(node, ept.Assignment):
+        return all(_is_constant(d) for d in node.descendents)
+    return False
+
+def _compile(node, compile_child):
+    compiled = _compile_unfolded(node, compile_child)
+    if not hasattr(compiled, "constant_value") and _is_constant(node):
+        # evaluate it once, now, rather than every time the expression is evaluated
+        try:
+            return _compile_constant(compiled(None))
+        except Exception:
+            # the error is raised when the expression is evaluated, as it was before
+            pass
+    return compiled
+
+def _compile_unfolded(node, compile_child):
+    node_type = type(node)
+    evaluate = getattr(node_type, "evaluate", None)
+
+    if evaluate in (ept.ExplicitLiteral.evaluate, ept.StringLiteral.evaluate):
+        return _compile_constant(node.value)
+
+    if node_type in _in_operators:
+        compiled = _compile_in(node, compile_child)
+        if compiled is not None:
+            return compiled
+
+    if evaluate is ept.Var.evaluate:
+        return _compile_var(node.value)
+
+    if isinstance(node, ept.Assignment):
+        return _compile_assignment(str(node.left), compile_child(node.right))
+
+    if evaluate is ept.Opp.evaluate:
+        return _compile_numexpr(node, _compile_binary(_get_kernel(node), node.left, node.right, compile_child))
+
+    if evaluate is ept.UnaryOpp.evaluate:
+        return _compile_numexpr(node, _compile_unary(_get_kernel(node), compile_child(node.right)))
+
+    if evaluate is ept.UnaryOppLeft.evaluate:
+        return _compile_unary(_get_kernel(node), compile_child(node.left))
+
+    if node_type is ept.Between or node_type is ept.NotBetween:
+        return _compile_between(node, compile_child)
+
+    if node_type is ept.Dot:
+        return _compile_dot(compile_child(node.left), str(node.right))
+
+    if node_type is ept.SortColumn:
+        return compile_child(node.left)
+
+    if node_type is ept.Method:
+        return _compile_method(node, compile_child)
+
+    if node_type is ept.Args:
+        return _compile_list([compile_child(a) for a in node.args])
+
+    if node_type is ept.ListExpression:
+        return _compile_list([compile_child(a) for a in node.items])
+
+    if node_type is ept.SquareBrackets:
+        return _compile_square_brackets(compile_child(node.variable), compile_child(node.value))
+
+    # anything else, e.g. a query parameter, is evaluated by the node itself
+    return _compile_fallback(weakref.ref(node))
+
+def _compile_constant(value):
+    def constant(vals):
+        return value
+    # so that the operators which use it can bind the value
+    constant.constant_value = value
+    return constant
+
+def _compile_fallback(node_ref):
+    def evaluate_node(vals):
+        return node_ref().evaluate(vals)
+    return evaluate_node
+
+def _compile_var(name):
+    def var(vals):
+        return vals[name]
+    return var
+
+def _compile_assignment(name, right):
+    def assignment(vals):
+        return {name: right(vals)}
+    return assignment
+
+def _compile_binary(kernel, left_node, right_node, compile_child):
+    left = compile_child(left_node)
+    right = compile_child(right_node)
+
+    right_value = getattr(right, "constant_value", _missing)
+    if right_value is not _missing:
+        def binary_right_constant(vals):
+            return kernel(left(vals), right_value)
+        return binary_right_constant
+
+    left_value = getattr(left, "constant_value", _missing)
+    if left_value is not _missing:
+        def binary_left_constant(vals):
+            return kernel(left_value, right(vals))
+        return binary_left_constant
+
+    def binary(vals):
+        return kernel(left(vals), right(vals))
+    return binary
+
+def _compile_unary(kernel, operand):
+    def unary(vals):
+        return kernel(operand(vals))
+    return unary
+
+def _compile_between(node, compile_child):
+    if not isinstance(node.right, ept.DotDot):
+        raise Exception("Between operator must act on DotDot")
+    left = compile_child(node.left)
+    lower = compile_child(node.right.left)
+    upper = compile_child(node.right.right)
+    negate = isinstance(node, ept.NotBetween)
+
+    def between(vals):
+        result = ept._between_values(left(vals), lower(vals), upper(vals))
+        if negate:
+            return ept._not(result)
+        return result
+    return between
+
+def _compile_dot(left, key):
+    def dot(vals):
+        return ept._square_brackets_evaluate(left(vals), key)
+    return dot
+
+def _compile_method(node, compile_child):
+    name = compile_child(node.name)
+    args = [compile_child(a) for a in node.args.args]
+    node_ref = weakref.ref(node)
+
+    def method(vals):
+        if isinstance(vals, ept.AggregateScope):
+            # the results of the aggregates are keyed by their Method node
+            result = vals.aggregate_results.get(node_ref(), _missing)
+            if result is not _missing:
+                return result
+        function = name(vals)
+        return function(*[a(vals) for a in args])
+    return method
+
+def _compile_list(items):
+    def list_expression(vals):
+        return [i(vals) for i in items]
+    return list_expression
+
+def _compile_square_brackets(variable, value):
+    def square_brackets(vals):
+        return ept._square_brackets_evaluate(variable(vals), value(vals))
+    return square_brackets
+
+# in, !in, in~ and !in~: whether they are case insensitive and whether they are negated
+_in_operators = {
+    ept.In: (False, False),
+    ept.NotIn: (False, True),
+    ept.InCis: (True, False),
+    ept.NotInCis: (True, True),
+}
+
+class _ValueSet:
+    """
+    The constant list on the right of in, e.g. A in ("a", "b", ...), prepared once for the lookups.  
+    The values are lower cased once for in~
+    """
+    def __init__(self, values, lower):
+        if lower:
+            values = [v.lower() for v in values]
+        self.values = values
+        try:
+            self.value_set = frozenset(values)
+        except TypeError:
+            # e.g. a list of lists
+            self.value_set = None
+        # An index builds its hash table once, while Series.isin builds one for the values on every call
+        self.index = None
+        if self.value_set is not None:
+            self.index = pd.Index(values).drop_duplicates()
+
+    def contains(self, value):
+        if self.value_set is not None:
+            try:
+                return value in self.value_set
+            except TypeError:
+                pass
+        return value in self.values
+
+    def isin(self, series):
+        if self.index is not None and _same_kind(series.dtype, self.index.dtype):
+            return pd.Series(self.index.get_indexer(series) >= 0, index=series.index, name=series.name)
+        return series.isin(self.values)
+
+def _same_kind(dtype, other):
+    # Index.get_indexer finds the same values as Series.isin for these.  Not e.g. for booleans or categories
+    if isinstance(dtype, pd.StringDtype):
+        # the default for strings from pandas 3.0
+        return dtype == other
+    if not isinstance(dtype, np.dtype) or not isinstance(other, np.dtype):
+        return False
+    if dtype.kind == "O" and other.kind == "O":
+        return True
+    return dtype.kind in "iuf" and other.kind in "iuf"
+
+def _compile_in(node, compile_child):
+    values = getattr(compile_child(node.right), "constant_value", None)
+    if not isinstance(values, list):
+        return None
+
+    lower, negate = _in_operators[type(node)]
+    try:
+        value_set = _ValueSet(values, lower)
+    except Exception:
+        # e.g. a number in the list of in~.  The error is raised when the expression is evaluated
+        return None
+    left = compile_child(node.left)
+
+    def in_list(vals):
+        value = left(vals)
+        if isinstance(value, pd.Series):
+            if lower:
+                value = value.str.lower()
+            result = value_set.isin(value)
+        else:
+            if lower:
+                value = value.lower()
+            result = value_set.contains(value)
+        if negate:
+            return ept._not(result)
+        return result
+    return in_list
+
+def _to_numexpr(node, leaves):
+    """
+    return the numexpr string for the expression and add its variables and literals to leaves, 
+    or None if numexpr can't evaluate it
+    """
+    node_type = type(node)
+    if node_type in _numexpr_binary_operators:
+        left = _to_numexpr(node.left, leaves)
+        right = _to_numexpr(node.right, leaves)
+        if left is None or right is None:
+            return None
+        return "({} {} {})".format(left, _numexpr_binary_operators[node_type], right)
+
+    if node_type in _numexpr_unary_operators:
+        right = _to_numexpr(node.right, leaves)
+        if right is None:
+            return None
+        return "({}{})".format(_numexpr_unary_operators[node_type], right)
+
+    if node_type in (ept.Var, ept.Int, ept.Float):
+        # the names in the expression are replaced because column names don't have to be valid numexpr names
+        leaves.append(_compile_node(node))
+        return "v" + str(len(leaves) - 1)
+
+    return None
+
+def _is_numexpr_scalar(value):
+    return isinstance(value, (bool, int, float, np.bool_, np.integer, np.floating))
+
+_numexpr_dtypes = (np.dtype(bool), np.dtype(np.int64), np.dtype(np.float64))
+
+def _numexpr_index(values):
+    """
+    return the index of the Series in values if numexpr gives the same result as pandas for them, otherwise None
+    """
+    index = None
+    for value in values:
+        if isinstance(value, pd.Series):
+            if value.dtype not in _numexpr_dtypes:
+                return None
+            if index is None:
+                index = value.index
+            elif value.index is not index and not value.index.equals(index):
+                # pandas would align them
+                return None
+        elif not _is_numexpr_scalar(value):
+            return None
+    return index
+
+def _compile_numexpr(node, fallback):
+    leaves = []
+    expression = _to_numexpr(node, leaves)
+    if expression is None or expression.count("(") < 2:
+        # pandas already uses numexpr for a single operator on large columns
+        return fallback
+
+    def evaluate_numexpr(vals):
+        numexpr = _get_numexpr()
+        if not numexpr or not _numexpr_enabled:
+            return fallback(vals)
+
+        values = [leaf(vals) for leaf in leaves]
+        index = _numexpr_index(values)
+        if index is None:
+            return fallback(vals)
+
+        local_dict = dict(("v" + str(i), v.to_numpy() if isinstance(v, pd.Series) else v) for i, v in enumerate(values))
+        try:
+            result = numexpr.evaluate(expression, local_dict=local_dict, global_dict={})
+        except Exception:
+            # e.g. arithmetic on booleans, which numexpr doesn't support.  pandas either supports it or raises the error
+            return fallback(vals)
+        return pd.Series(result, index=index)
+    return evaluate_numexpr
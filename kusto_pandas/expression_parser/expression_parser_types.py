@@ -382,7 +382,9 @@ def _between(left, right, vals):
     left = left.evaluate(vals)
     lower = right.left.evaluate(vals)
     upper = right.right.evaluate(vals)
+    return _between_values(left, lower, upper)
 
+def _between_values(left, lower, upper):
     if are_all_series(left):
         return (lower <= left) & (left <= upper)
     return lower <= left and left <= upper
@@ -567,6 +569,25 @@ class Var(NumOrVar):
     def evaluate(self, vals):
         return vals[self.value]
     
+class QueryParameter(Var):
+    """
+    A parameter of a prepared query, e.g. @threshold.
+
+    The value is bound with let under the name "@threshold", which can't collide with a column or variable name.
+    """
+    prefix = "@"
+    def __str__(self):
+        return self.get_bound_name()
+    def __repr__(self):
+        return "QueryParameter({})".format(self.value)
+    def get_bound_name(self):
+        return self.prefix + self.value
+    def evaluate(self, vals):
+        try:
+            return vals[self.get_bound_name()]
+        except KeyError:
+            raise KeyError("No value was bound to the query parameter " + self.get_bound_name())
+
 class ColumnNameOrPattern(Var):
     def get_matching_columns(self, df):
         pattern = self.value
@@ -601,30 +622,38 @@ class Args(Expression):
     def evaluate(self, vals):
         return [a.evaluate(vals) for a in self.args]
 
+class AggregateScope:
+    """
+    The variables used to evaluate an aggregate expression, e.g. avg(A) + 1, after the groupby has been applied.
+
+    The parsed expression tree is shared between executions (and threads), so the results of the
+    aggregate methods are stored here, keyed by the Method node that produced them, rather than on the tree itself.
+    """
+    def __init__(self, vals, aggregate_results):
+        self.vals = vals
+        self.aggregate_results = aggregate_results
+        self.shared_results = dict()
+
+    def __getitem__(self, key):
+        return self.vals[key]
+
 class Method(Expression):
     def __init__(self, name, args):
         self.name = name
         self.args = args
         self.descendents = [name, args]
-        self.aggregate_instance = None
 
     def __str__(self):
         return str(self.name) + str(self.args)
     def __repr__(self):
         return str(self)
     def evaluate(self, vals):
-        if self.has_aggregate_instance():
-            return self.aggregate_instance.evaluate(vals)
+        if isinstance(vals, AggregateScope) and self in vals.aggregate_results:
+            return vals.aggregate_results[self]
 
         method = self.name.evaluate(vals)
         args = self.args.evaluate(vals)
         return method(*args)
-    
-    def set_aggregate_instance(self, agg):
-        self.aggregate_instance = agg
-    
-    def has_aggregate_instance(self):
-        return self.aggregate_instance is not None
 
 def _square_brackets_apply(v, k):
     try:
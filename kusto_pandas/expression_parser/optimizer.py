@@ -0,0 +1,588 @@
+"""
+Rewrite passes over the logical plan of a query before it is evaluated.
+
+A plan is the tree of tabular operators produced by the parser, e.g. Pipe([TableIdentifier, Where, Extend, ...]).
+Parsed trees are cached and shared between executions, so a pass must never modify a node in place.
+Instead it returns new nodes for the parts of the plan it changes.
+"""
+
+import copy
+
+import pandas as pd
+
+from .expression_parser_types import Expression, Var, Method, Dot, Assignment, Star
+from .tabular_operators import Query, QueryStatement, TabularOperator, ColumnSubset
+from .tabular_operators import Pipe, Table, TableIdentifier, Where, FusedWhere, WhereTake, Extend, Project, ProjectRename, Sort, Join, Union
+from .tabular_operators import Take, Top, Summarize, Distinct, Count, LetValues, ProjectAway, ProjectKeep, ProjectReorder
+from .tabular_operators import Let
+from ._simple_expression import SimpleExpression, _get_method_default_name
+from .compiler import expression_key, is_shareable
+
+_NODE_TYPES = (Expression, Query, QueryStatement, TabularOperator)
+
+def iter_nodes(node):
+    """
+    yield every node of a parsed query: statements, tabular operators and expressions
+    """
+    stack = [node]
+    seen = set()
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (list, tuple)):
+            stack.extend(node)
+            continue
+        if isinstance(node, dict):
+            stack.extend(node.values())
+            continue
+        if not isinstance(node, _NODE_TYPES) or id(node) in seen:
+            # skip values which are not part of the plan, e.g. the DataFrame in a Table
+            continue
+        seen.add(id(node))
+        yield node
+        stack.extend(vars(node).values())
+
+def _expression_children(expression):
+    if isinstance(expression, Method):
+        # the name of a method is not a column
+        return [expression.args]
+    if isinstance(expression, Dot):
+        # the right side of D.k is a key, not a variable
+        return [expression.left]
+    if isinstance(expression, Assignment):
+        # the left side is the name of the result
+        return [expression.right]
+    return getattr(expression, "descendents", [])
+
+def referenced_names(expression):
+    """
+    the names of the columns and variables an expression reads
+    """
+    if isinstance(expression, Var):
+        return {str(expression)}
+    names = set()
+    for child in _expression_children(expression):
+        names |= referenced_names(child)
+    return names
+
+def _rename_columns(expression, names):
+    """
+    return a copy of expression with the columns renamed according to names, a map from old name to new name.
+    The nodes which don't change are shared with the original
+    """
+    if isinstance(expression, Var):
+        if type(expression) is Var and names.get(expression.value, expression.value) != expression.value:
+            return Var(names[expression.value], is_quoted=expression.is_quoted)
+        return expression
+
+    return _map_children(expression, lambda c: _rename_columns(c, names))
+
+def _map_children(expression, function):
+    """
+    return expression with function applied to each of its children.  expression is copied only if a child changes
+    """
+    children = _expression_children(expression)
+    mapped = dict((id(c), function(c)) for c in children)
+    if all(mapped[id(c)] is c for c in children):
+        return expression
+
+    expression = copy.copy(expression)
+    for attr, value in vars(expression).items():
+        if isinstance(value, list):
+            setattr(expression, attr, [mapped.get(id(v), v) for v in value])
+        elif id(value) in mapped:
+            setattr(expression, attr, mapped[id(value)])
+    return expression
+
+def _vector_variables(plan):
+    """
+    the names of the let variables in plan which can hold more than one value, e.g. a Series.
+    These are lined up with the rows of the table as a whole, so an expression which reads one is not row wise.
+    The values of let statements in a query are only known when it runs, so they are included too
+    """
+    names = set()
+    for node in iter_nodes(plan):
+        if isinstance(node, Let):
+            names.add(str(node.left))
+            continue
+
+        if isinstance(node, Table):
+            statements = node.table.let_statements
+        elif isinstance(node, LetValues):
+            statements = [node.values]
+        else:
+            continue
+
+        for d in statements:
+            names |= set(n for n, v in d.items() if not callable(v) and not pd.api.types.is_scalar(v))
+    return frozenset(names)
+
+def _is_row_wise(expression, vectors):
+    """
+    True if each row of the result only depends on the same row of the input.  Then the expression gives the same
+    result for a row whether or not other rows were filtered out first.
+
+    The built in methods are row wise.  Methods passed in with let can do anything, e.g. x - x.mean(), so they are not.
+    Neither are the let variables in vectors (see _vector_variables)
+    """
+    # imported here because methods imports the expression parser
+    from ..methods import get_methods
+    methods = get_methods()
+    if referenced_names(expression) & vectors:
+        return False
+    return all(str(n.name) in methods for n in iter_nodes(expression) if isinstance(n, Method))
+
+def _assigned_name(parsed):
+    """
+    the name of the column which an extend or project argument creates, or None if it is a generated name
+    """
+    if isinstance(parsed, Assignment):
+        return str(parsed.left)
+    if isinstance(parsed, Var):
+        return str(parsed)
+    if isinstance(parsed, Method):
+        return _get_method_default_name(parsed)
+    return None
+
+def _get_columns(plan):
+    """
+    the names of the columns produced by a plan, or None if they can't be known without running it
+    """
+    if isinstance(plan, Table):
+        return [c for c in plan.table.df.columns if plan.columns is None or plan.columns.matches(c)]
+    if not isinstance(plan, Pipe) or not isinstance(plan.tabular_operators[0], Table):
+        return None
+
+    columns = _get_columns(plan.tabular_operators[0])
+    for op in plan.tabular_operators[1:]:
+        if isinstance(op, (Where, Sort)):
+            continue
+        names = None
+        if isinstance(op, Extend):
+            names = [_assigned_name(a) for a in op.args]
+            columns = columns + [n for n in names if n not in columns]
+        elif isinstance(op, Project):
+            names = columns = [_assigned_name(a) for a in op.columns]
+        elif isinstance(op, ProjectRename):
+            renames = dict((str(se.expression), se.get_name()) for se in map(SimpleExpression, op.simple_assignments))
+            columns = [renames.get(c, c) for c in columns]
+            names = columns
+        if names is None or None in names:
+            return None
+    return columns
+
+def _join_output_columns(join, left_columns):
+    """
+    map each column produced by the join to the side it comes from and its name on that side, e.g. "B_y" => ("right", "B")
+    """
+    right_columns = _get_columns(join.right)
+    if left_columns is None or right_columns is None:
+        return None
+
+    kwargs = join.kwargs
+    left_on, right_on = kwargs.get("left_on"), kwargs.get("right_on")
+    if kwargs.get("on") is not None:
+        left_on = right_on = kwargs["on"]
+    elif left_on is None and right_on is None:
+        # pandas joins on the columns the two sides have in common
+        left_on = right_on = [c for c in left_columns if c in right_columns]
+    if isinstance(left_on, str):
+        left_on = [left_on]
+    if isinstance(right_on, str):
+        right_on = [right_on]
+
+    # a key with the same name on both sides appears only once in the output
+    merged_keys = set(l for l, r in zip(left_on, right_on) if l == r)
+
+    output = dict((c, ("left", c)) for c in left_columns)
+    for c in right_columns:
+        if c in merged_keys:
+            continue
+        name = c + "_y" if c in left_columns else c
+        if name in output:
+            return None
+        output[name] = ("right", c)
+    return output
+
+def _push_into_join(operators, join, where, vectors):
+    """
+    move where into one of the inputs of the join.  return the new list of operators, or None if it can't be moved
+    """
+    output = _join_output_columns(join, _get_columns(Pipe(operators)))
+    if output is None:
+        return None
+
+    # names which are not columns of either side are variables, which are the same on both sides
+    columns = [output[n] for n in referenced_names(where.predicate) if n in output]
+    sides = set(side for side, _ in columns)
+    kind = join.kwargs.get("kind", "inner")
+
+    if sides == {"left"} and kind in ("inner", "left"):
+        return _push_down_where(operators, where, vectors) + [join]
+
+    if sides == {"right"} and kind in ("inner", "right"):
+        names = dict((n, c) for n, (side, c) in output.items() if side == "right")
+        predicate = _rename_columns(where.predicate, names)
+        right = join.right
+        right_operators = list(right.tabular_operators) if isinstance(right, Pipe) else [right]
+        right = Pipe(_push_down_where(right_operators, Where(predicate), vectors))
+        return operators + [Join(right, join.kwargs)]
+
+    return None
+
+def _predicate_before(op, predicate, vectors):
+    """
+    return the predicate which selects the same rows before op as predicate does after it, or None if there is none
+    """
+    names = referenced_names(predicate)
+
+    if isinstance(op, Extend):
+        if not all(_is_row_wise(a, vectors) for a in op.args):
+            return None
+        created = set(_assigned_name(a) for a in op.args)
+        if None in created or names & created:
+            # an argument without a name creates a column with a generated name, e.g. Column1
+            return None
+        return predicate
+
+    if isinstance(op, Sort):
+        if not all(_is_row_wise(c, vectors) for c in op.sort_columns):
+            return None
+        return predicate
+
+    if isinstance(op, Project):
+        # only columns which project passes through or renames.  A name which project doesn't create could be a
+        # variable after the project and a column before it
+        sources = dict()
+        for parsed in op.columns:
+            se = SimpleExpression(parsed)
+            if type(se.expression) is Var:
+                sources[_assigned_name(parsed)] = str(se.expression)
+            else:
+                sources[_assigned_name(parsed)] = None
+        if not all(sources.get(n) is not None for n in names):
+            return None
+        return _rename_columns(predicate, sources)
+
+    if isinstance(op, ProjectRename):
+        renames = dict()
+        for parsed in op.simple_assignments:
+            se = SimpleExpression(parsed)
+            renames[se.get_name()] = str(se.expression)
+        if names & (set(renames.values()) - set(renames)):
+            # the predicate uses an old name, which is no longer a column after the rename
+            return None
+        return _rename_columns(predicate, renames)
+
+    return None
+
+def _push_down_where(operators, where, vectors):
+    """
+    add where to the end of operators, moving it before the operators which it can run before without changing the result
+    """
+    if len(operators) > 1 and _is_row_wise(where.predicate, vectors):
+        previous = operators[-1]
+        if isinstance(previous, Join):
+            pushed = _push_into_join(operators[:-1], previous, where, vectors)
+            if pushed is not None:
+                return pushed
+        else:
+            predicate = _predicate_before(previous, where.predicate, vectors)
+            if predicate is not None:
+                if predicate is not where.predicate:
+                    where = Where(predicate)
+                return _push_down_where(operators[:-1], where, vectors) + [previous]
+
+    return operators + [where]
+
+def push_down_predicates(plan, vectors=None):
+    """
+    Run filters as early as possible, so that the operators before them in the query run on fewer rows.
+
+    A where moves before extend, project, project-rename and sort when it doesn't use the columns they compute, and into
+    the left or right input of a join when it only uses the columns of that side.
+    """
+    if not isinstance(plan, Pipe):
+        return plan
+    if vectors is None:
+        vectors = _vector_variables(plan)
+
+    operators = []
+    for op in plan.tabular_operators:
+        if isinstance(op, Join):
+            op = Join(push_down_predicates(op.right, vectors), op.kwargs)
+        if isinstance(op, Where):
+            operators = _push_down_where(operators, op, vectors)
+        else:
+            operators.append(op)
+    return Pipe(operators)
+
+def _names_used(parsed_list):
+    names = set()
+    for parsed in parsed_list:
+        names |= referenced_names(parsed)
+    return names
+
+def _patterns(column_name_or_pattern_list):
+    return [c.value for c in column_name_or_pattern_list]
+
+def _columns_needed_before(op, needed):
+    """
+    return the columns op needs from its input so that it produces the columns needed after it.
+    needed is a ColumnSubset, or None for all of the columns
+    """
+    if isinstance(op, (Take, LetValues)):
+        return needed
+
+    if isinstance(op, Count):
+        return ColumnSubset([])
+
+    if isinstance(op, Project):
+        return ColumnSubset(_names_used(op.columns))
+
+    if isinstance(op, ProjectKeep):
+        # the columns after project-keep are the ones which match, so it doesn't matter what is needed after it
+        return ColumnSubset([], _patterns(op.column_name_or_pattern_list))
+
+    if isinstance(op, Summarize):
+        if any(isinstance(n, Star) for n in iter_nodes(op.aggregates)):
+            # e.g. any(*) uses every column
+            return None
+        return ColumnSubset(_names_used(op.aggregates + op.by))
+
+    if isinstance(op, Distinct):
+        if op.columnsOrStar == "*":
+            return None
+        return ColumnSubset(_names_used(op.columnsOrStar))
+
+    if needed is None:
+        return None
+
+    if isinstance(op, Where):
+        return needed.union(referenced_names(op.predicate))
+
+    if isinstance(op, (FusedWhere, WhereTake)):
+        return needed.union(_names_used(op.predicates))
+
+    if isinstance(op, (Sort, Top)):
+        return needed.union(_names_used(op.sort_columns))
+
+    if isinstance(op, Extend):
+        created = [_assigned_name(a) for a in op.args]
+        if None in created:
+            # the generated names, e.g. Column1, depend on which columns the table has
+            return None
+        return ColumnSubset(needed.names - set(created), needed.patterns).union(_names_used(op.args))
+
+    if isinstance(op, ProjectRename):
+        names = set(needed.names)
+        for parsed in op.simple_assignments:
+            se = SimpleExpression(parsed)
+            names.discard(se.get_name())
+            # the old name is needed even if the new one isn't, because project-rename fails without it
+            names.add(str(se.expression))
+        return ColumnSubset(names, needed.patterns)
+
+    if isinstance(op, (ProjectAway, ProjectReorder)):
+        # these fail if a pattern doesn't match any column, so keep the columns which match
+        return needed.union(patterns=_patterns(op.column_name_or_pattern_list))
+
+    # e.g. join, where the names of the columns depend on the columns of the other side
+    return None
+
+def prune_columns(plan):
+    """
+    Read only the columns of a table which the query uses, so that the operators which copy rows, e.g. where and sort, 
+    copy less data.
+
+    The columns are found by going backwards through the query from the end, which needs all of its columns.
+    """
+    if not isinstance(plan, Pipe):
+        return plan
+
+    operators = []
+    for op in plan.tabular_operators:
+        if isinstance(op, Join):
+            op = Join(prune_columns(op.right), op.kwargs)
+        elif isinstance(op, Union):
+            op = Union([prune_columns(t) for t in op.right_tables], op.kwargs)
+        operators.append(op)
+
+    needed = None
+    for op in reversed(operators[1:]):
+        needed = _columns_needed_before(op, needed)
+
+    scan = operators[0]
+    if needed is not None and isinstance(scan, (Table, TableIdentifier)) and scan.columns is None:
+        if isinstance(scan, Table):
+            scan = Table(scan.table, needed)
+        else:
+            scan = TableIdentifier(scan.identifier, needed)
+        operators[0] = scan
+
+    return Pipe(operators)
+
+def _predicates(op):
+    if isinstance(op, Where):
+        return [op.predicate]
+    if isinstance(op, FusedWhere):
+        return list(op.predicates)
+    return None
+
+def fuse_where(plan):
+    """
+    Combine where clauses which follow each other into one FusedWhere, so that the rows are only copied once
+    """
+    if not isinstance(plan, Pipe):
+        return plan
+
+    operators = []
+    for op in plan.tabular_operators:
+        if isinstance(op, Join):
+            op = Join(fuse_where(op.right), op.kwargs)
+        elif isinstance(op, Union):
+            op = Union([fuse_where(t) for t in op.right_tables], op.kwargs)
+
+        predicates = _predicates(op)
+        if predicates is not None and operators and _predicates(operators[-1]) is not None:
+            operators[-1] = FusedWhere(_predicates(operators[-1]) + predicates)
+        else:
+            operators.append(op)
+    return Pipe(operators)
+
+def sort_take_to_top(plan):
+    """
+    Replace sort | take n with top n, which doesn't have to sort all of the rows
+    """
+    if not isinstance(plan, Pipe):
+        return plan
+
+    operators = []
+    for op in plan.tabular_operators:
+        if isinstance(op, Join):
+            op = Join(sort_take_to_top(op.right), op.kwargs)
+        elif isinstance(op, Union):
+            op = Union([sort_take_to_top(t) for t in op.right_tables], op.kwargs)
+
+        if isinstance(op, Take) and operators and isinstance(operators[-1], Sort):
+            operators[-1] = Top(op.n, operators[-1].sort_columns)
+        else:
+            operators.append(op)
+    return Pipe(operators)
+
+def _keeps_rows(op, take, vectors):
+    """
+    True if take can run before op.  op must produce one row for each input row, in the same order, regardless of the other rows
+    """
+    # a parameter like @n can't be shadowed by a column
+    names = set(str(n) for n in iter_nodes(take.n) if type(n) is Var)
+    if isinstance(op, Extend):
+        created = set(_assigned_name(a) for a in op.args)
+        return all(_is_row_wise(a, vectors) for a in op.args) and not (names & created)
+    if isinstance(op, (Project, ProjectRename, ProjectAway, ProjectKeep, ProjectReorder)):
+        # these change which names are columns, so n must not use any names
+        return not names and (not isinstance(op, Project) or all(_is_row_wise(c, vectors) for c in op.columns))
+    return False
+
+def push_down_limits(plan, vectors=None):
+    """
+    Run take as early as possible, so that the operators before it only see the rows which are returned.
+
+    take moves before extend and the project operators, which keep the rows as they are.  Directly after a where, 
+    take becomes a WhereTake, which stops checking rows once it has found enough of them
+    """
+    if not isinstance(plan, Pipe):
+        return plan
+    if vectors is None:
+        vectors = _vector_variables(plan)
+
+    operators = []
+    for op in plan.tabular_operators:
+        if isinstance(op, Join):
+            op = Join(push_down_limits(op.right, vectors), op.kwargs)
+        elif isinstance(op, Union):
+            op = Union([push_down_limits(t, vectors) for t in op.right_tables], op.kwargs)
+
+        if not isinstance(op, Take):
+            operators.append(op)
+            continue
+
+        moved = []
+        while len(operators) > 1 and _keeps_rows(operators[-1], op, vectors):
+            moved.insert(0, operators.pop())
+
+        predicates = _predicates(operators[-1])
+        if predicates is not None and all(_is_row_wise(p, vectors) for p in predicates):
+            operators[-1] = WhereTake(predicates, op.n)
+        else:
+            operators.append(op)
+        operators += moved
+    return Pipe(operators)
+
+def _extended_columns(extend, vectors):
+    """
+    map the key of each expression which extend assigns to a column to the name of that column.
+    Only the expressions which have the same value after the extend, because they don't read a column it assigns
+    """
+    names = [_assigned_name(a) for a in extend.args]
+    columns = dict()
+    for parsed, name in zip(extend.args, names):
+        if not isinstance(parsed, Assignment) or names.count(name) > 1 or not is_shareable(parsed.right):
+            continue
+        if referenced_names(parsed.right) & set(names):
+            continue
+        columns[expression_key(parsed.right)] = (name, _is_row_wise(parsed.right, vectors))
+    return columns
+
+def _use_columns(expression, columns, keys):
+    key = keys.get(id(expression))
+    if key in columns:
+        return Var(columns[key][0])
+    return _map_children(expression, lambda c: _use_columns(c, columns, keys))
+
+def _use_extended_columns(expression, columns):
+    keys = dict()
+    expression_key(expression, keys)
+    return _use_columns(expression, columns, keys)
+
+def reuse_extended_columns(plan, vectors=None):
+    """
+    Read a column which an extend has just computed instead of computing the same expression again, e.g.
+    extend d = todynamic(Props) | where todynamic(Props).k == 1 becomes extend d = todynamic(Props) | where d.k == 1
+
+    This applies to the where clauses directly after the extend, and to the next extend.  After the first where only the 
+    row wise expressions are reused, because the others can give a different value for a row when other rows are removed
+    """
+    if not isinstance(plan, Pipe):
+        return plan
+    if vectors is None:
+        vectors = _vector_variables(plan)
+
+    operators = []
+    columns = dict()
+    for op in plan.tabular_operators:
+        if isinstance(op, Join):
+            op = Join(reuse_extended_columns(op.right, vectors), op.kwargs)
+        elif isinstance(op, Union):
+            op = Union([reuse_extended_columns(t, vectors) for t in op.right_tables], op.kwargs)
+
+        if columns and isinstance(op, Where):
+            op = Where(_use_extended_columns(op.predicate, columns))
+            columns = dict((key, value) for key, value in columns.items() if value[1])
+        elif columns and isinstance(op, Extend):
+            # an argument without a name is left as it is, because its name, e.g. log_A, can depend on the expression
+            op = Extend([_use_extended_columns(a, columns) if isinstance(a, Assignment) else a for a in op.args])
+
+        if isinstance(op, Extend):
+            columns = _extended_columns(op, vectors)
+        elif not isinstance(op, Where):
+            columns = dict()
+        operators.append(op)
+    return Pipe(operators)
+
+# Each pass takes a plan and returns an equivalent plan.  They are run in order.
+_REWRITE_PASSES = [reuse_extended_columns, push_down_predicates, prune_columns, fuse_where, push_down_limits, sort_take_to_top]
+
+def optimize(plan):
+    for rewrite in _REWRITE_PASSES:
+        plan = rewrite(plan)
+    return plan
@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+ParseCacheInfo = namedtuple("ParseCacheInfo", ["hits", "misses", "evictions", "maxsize", "currsize"])
+
+DEFAULT_PARSE_CACHE_SIZE = 1024
+
+class ParseCache:
+    """
+    A size bounded least-recently-used cache of parsed expression trees.
+
+    The key is the query text together with the root rule of the grammar used to parse it.
+    The same query text parsed with a different root rule can result in a different tree, e.g.
+    "A" parsed as a statement is a Var, but parsed as a query it is a Pipe.
+
+    A maxsize of 0 disables caching.  A maxsize of None makes the cache unbounded.
+    """
+    def __init__(self, maxsize=DEFAULT_PARSE_CACHE_SIZE):
+        self._validate_maxsize(maxsize)
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _validate_maxsize(self, maxsize):
+        if maxsize is not None and maxsize < 0:
+            raise ValueError("maxsize must be a non-negative integer or None: " + str(maxsize))
+
+    def get_or_parse(self, text, root, parse):
+        """
+        Return the cached tree for (text, root), or call parse() and cache the result.
+
+        Errors raised by parse() are not cached.
+        """
+        key = (text, root)
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return value
+
+        # parse outside of the lock so that a slow parse does not block other threads.
+        # If two threads parse the same text at the same time the last one wins, which is harmless.
+        value = parse()
+
+        if self.maxsize == 0:
+            return value
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+        return value
+
+    def _evict(self):
+        if self.maxsize is None:
+            return
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize):
+        self._validate_maxsize(maxsize)
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        """
+        remove all entries and reset the statistics
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def info(self):
+        with self._lock:
+            return ParseCacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
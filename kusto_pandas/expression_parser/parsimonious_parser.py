@@ -2,13 +2,15 @@ import json
 import os
 
 import parsimonious
-from parsimonious.grammar import Grammar
 from parsimonious.nodes import NodeVisitor
 
 from kusto_pandas.expression_parser.expression_parser_types import *
 
 from kusto_pandas.expression_parser.tabular_operators import *
 
+from kusto_pandas.expression_parser.parse_cache import ParseCache
+from kusto_pandas.expression_parser.compiled_grammar import load_grammar
+
 
 # Define the grammar of the Kusto language using the PEG format.
 # Then use a PEG parser compiler to parse the kusto language text
@@ -68,6 +70,7 @@ class Visitor(NodeVisitor):
         self.visit_columnNameOrPatternList = self._visit_list_with_at_least_one
         self.visit_simpleAssignmentList = self._visit_list_with_at_least_one
         self.visit_expressionList = self._visit_list_with_at_least_one
+        self.visit_methodArgList = self._visit_list_with_at_least_one
         self.visit_assignmentList = self._visit_list_with_at_least_one
 
         self.visit_sum = self._visit_binary_op_zero_or_more
@@ -136,6 +139,10 @@ class Visitor(NodeVisitor):
     def visit_identifier(self, node, children):
         return children[0]
 
+    def visit_queryParameter(self, node, children):
+        # "@" identifierUnquoted WS?
+        return QueryParameter(node.children[1].text)
+
     def visit_explicitLiteral(self, node, children):
         # "datetime" WS? LPAR datetimeIso6801 RPAR
         literal_type, _, _, string_value, _ = children
@@ -226,10 +233,9 @@ class Visitor(NodeVisitor):
 
         if in_parens is None:
             args = Args([])
-        elif in_parens == "*":
-            args = Args([Star()])
         else:
-            args = Args(in_parens)
+            # STAR is visited as the string "*"
+            args = Args([Star() if isinstance(arg, str) else arg for arg in in_parens])
         
         return Method(method, args)
     
@@ -434,22 +440,40 @@ class Visitor(NodeVisitor):
 
 
 _PARSER = dict()
+_GRAMMAR = []
 
-def _get_grammar():
-    kusto_peg_file = os.path.join(os.path.dirname(__file__), 'kusto_grammar.peg')
-    with open(kusto_peg_file) as fin:
-        kusto_peg = fin.read()
-    return kusto_peg
+def _get_compiled_grammar():
+    # the grammar is loaded on the first query rather than at import time
+    if not _GRAMMAR:
+        _GRAMMAR.append(load_grammar())
+    return _GRAMMAR[0]
 
 def get_parser(root):
     if not root in _PARSER:
-        kusto_peg = _get_grammar()
-        g = Grammar(kusto_peg)
-        _PARSER[root] = g.default(root)
+        _PARSER[root] = _get_compiled_grammar().default(root)
 
     return _PARSER[root]
 
-def parse_expression(input, debug=True, root="kustoStatement"):
+_PARSE_CACHE = ParseCache()
+
+def get_parse_cache():
+    """
+    The cache of parsed expression trees, keyed by the query text and the root rule.
+
+    get_parse_cache().info() returns the hit, miss and eviction counts
+    """
+    return _PARSE_CACHE
+
+def clear_parse_cache():
+    _PARSE_CACHE.clear()
+
+def set_parse_cache_size(maxsize):
+    """
+    Set the maximum number of parsed queries to keep.  0 disables the cache, None makes it unbounded
+    """
+    _PARSE_CACHE.resize(maxsize)
+
+def _parse_expression_uncached(input, debug, root):
     parser = get_parser(root)
 
     if debug:
@@ -471,6 +495,13 @@ def parse_expression(input, debug=True, root="kustoStatement"):
 
     return expression_tree
 
+def parse_expression(input, debug=True, root="kustoStatement"):
+    if debug:
+        # the point of debug is to print the parse, so don't short circuit it with the cache
+        return _parse_expression_uncached(input, debug, root)
+
+    return _PARSE_CACHE.get_or_parse(input, root, lambda: _parse_expression_uncached(input, debug, root))
+
 def parse_expression_tabular_operator(input, debug=False):
     return parse_expression(input, debug=debug, root="kustoTabularOperator")
 
@@ -1,18 +1,61 @@
+import fnmatch
+
+import numpy as np
 import pandas as pd
 
-from ._simple_expression import SimpleExpression, _evaluate_and_get_name, parse_column_name_or_pattern_list, remove_duplicates_maintain_order
-from .aggregates import create_aggregate
+from ._simple_expression import SimpleExpression, parse_column_name_or_pattern_list, remove_duplicates_maintain_order
+from ._simple_expression import replace_temp_column_names
+from .aggregates import create_aggregate, reduce_together
+from .compiler import evaluate_compiled, compile_expressions
 
-def ensure_column_name_unique(df, col):
-    while col in df.columns:
+def ensure_column_name_unique(columns, col):
+    while col in columns:
         col = col + "_"
     return col
 
+def select_columns(df, columns):
+    """
+    return a DataFrame with the given columns of df, which shares the column data with df rather than copying it
+    """
+    if not df.columns.is_unique:
+        return df[columns]
+    return pd.DataFrame(dict((c, df[c]) for c in columns), index=df.index, copy=False)
+
+def with_columns(df, new_columns):
+    """
+    return df with the columns in the dictionary new_columns added or replaced.  The other columns share their data with df.
+
+    Assigning to a column of a shallow copy can copy the other columns which are stored in the same block
+    """
+    if not df.columns.is_unique:
+        dfnew = df.copy(deep=False)
+        for name, value in new_columns.items():
+            dfnew[name] = value
+        return dfnew
+
+    columns = dict((c, df[c]) for c in df.columns)
+    columns.update(new_columns)
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+def rename_columns(df, col_map):
+    """
+    return df with the columns renamed, without copying the column data
+    """
+    dfnew = df.copy(deep=False)
+    dfnew.columns = [col_map.get(c, c) for c in df.columns]
+    return dfnew
+
 TABLE_SELF = "self"
 
+def _join_str(items):
+    return ", ".join(str(i) for i in items)
+
 class Query:
     def __init__(self, query_statements):
         self.query_statements = query_statements
+
+    def __str__(self):
+        return "; ".join(str(s) for s in self.query_statements)
     
     def evaluate_query(self, w):
         wnew = w
@@ -21,11 +64,15 @@ class Query:
         return wnew
 
 class QueryStatement:
-    pass
+    def __repr__(self):
+        return str(self)
 
 class Pipe(QueryStatement):
     def __init__(self, tabular_operators):
         self.tabular_operators = tabular_operators
+
+    def __str__(self):
+        return " | ".join(str(op) for op in self.tabular_operators)
     
     def evaluate_query(self, w):
         for op in self.tabular_operators:
@@ -36,10 +83,13 @@ class Let(QueryStatement):
     def __init__(self, left, right):
         self.left = left
         self.right = right
+
+    def __str__(self):
+        return "let {} = {}".format(self.left, self.right)
     
     def evaluate_query(self, w):
         left = str(self.left)
-        right = self.right.evaluate(w._get_var_map())
+        right = evaluate_compiled(self.right, w._get_var_map())
         wnew = w.let(**{left: right})
         return wnew   
 
@@ -47,6 +97,9 @@ class LetTable(QueryStatement):
     def __init__(self, left, right):
         self.left = left
         self.right = right
+
+    def __str__(self):
+        return "let {} = ({})".format(self.left, self.right)
     
     def evaluate_query(self, w):
         left = str(self.left)
@@ -56,6 +109,9 @@ class LetTable(QueryStatement):
         return wnew
 
 class TabularOperator:
+    def __repr__(self):
+        return str(self)
+
     def evaluate_query(self, w):
         newdf = self._evaluate_top(w.df, w._get_var_map())
         return w._copy(newdf)
@@ -63,78 +119,306 @@ class TabularOperator:
     def _evaluate_top(self, df, vars):
         raise NotImplementedError()
 
+class ColumnSubset:
+    """
+    The columns of a table which are used by the rest of a query: the names, plus the columns which match any of the 
+    patterns, e.g. Col*
+    """
+    def __init__(self, names, patterns=()):
+        self.names = frozenset(names)
+        self.patterns = tuple(patterns)
+
+    def __str__(self):
+        return _join_str(sorted(self.names) + list(self.patterns))
+
+    def union(self, names=(), patterns=()):
+        return ColumnSubset(self.names | set(names), self.patterns + tuple(p for p in patterns if p not in self.patterns))
+
+    def matches(self, column):
+        return column in self.names or any(fnmatch.fnmatchcase(column, p) for p in self.patterns)
+
+    def select(self, df):
+        columns = [c for c in df.columns if self.matches(c)]
+        if len(columns) == len(df.columns):
+            return df
+        return select_columns(df, columns)
+
+def _scan_str(table, columns):
+    if columns is None:
+        return table
+    return "{}[{}]".format(table, columns)
+
 class TableIdentifier(TabularOperator):
-    def __init__(self, identifier):
+    def __init__(self, identifier, columns=None):
         self.identifier = identifier
+        # a ColumnSubset, if the rest of the query only uses some of the columns of the table
+        self.columns = columns
+
+    def __str__(self):
+        return _scan_str(str(self.identifier), self.columns)
 
     def evaluate_query(self, w):
         wnew = w._set_active_table(str(self.identifier))
+        if self.columns is not None:
+            wnew = wnew._copy(self.columns.select(wnew.df))
+        return wnew
+
+class Table(TabularOperator):
+    """
+    A table which is already in memory, e.g. the Wrap at the start of a lazy plan.
+
+    This is not part of the Kusto grammar.  It plays the role of TableIdentifier when the table is held directly
+    """
+    def __init__(self, table, columns=None):
+        # table is an instance of Wrap
+        self.table = table
+        # a ColumnSubset, if the rest of the query only uses some of the columns of the table
+        self.columns = columns
+
+    def __str__(self):
+        return _scan_str("table({} columns)".format(len(self.table.df.columns)), self.columns)
+
+    def evaluate_query(self, w):
+        df = self.table.df
+        if self.columns is not None:
+            df = self.columns.select(df)
+        wnew = self.table._copy(df)
+        wnew.let_statements = wnew.let_statements + w.let_statements
         return wnew
 
+class LetValues(TabularOperator):
+    """
+    Define variables or methods for the following tabular operators, like Wrap.let
+    """
+    def __init__(self, values):
+        self.values = values
+
+    def __str__(self):
+        return "let " + _join_str(self.values.keys())
+
+    def evaluate_query(self, w):
+        return w.let(**self.values)
+
+class SubQuery(TabularOperator):
+    """
+    Run a full query with the current table bound to self, like Wrap.execute
+    """
+    def __init__(self, query):
+        self.query = query
+
+    def __str__(self):
+        return "({})".format(self.query)
+
+    def evaluate_query(self, w):
+        return w._execute_parsed(self.query)
+
 class As(TabularOperator):
     def __init__(self, identifier):
         self.identifier = identifier
+
+    def __str__(self):
+        return "as " + str(self.identifier)
     
     def evaluate_query(self, w):
         identifier = str(self.identifier)
         wnew = w.let(**{identifier: w.df})
         return wnew
 
+def take_rows(data, positions):
+    """
+    the rows of the DataFrame or Series data at positions.  A run of consecutive positions, e.g. from take, is sliced 
+    like df.head does.  Then the index isn't turned into an array first, which pandas < 2 does for a RangeIndex
+    """
+    n = len(positions)
+    if n == 0 or (positions[-1] - positions[0] == n - 1 and (n == 1 or (np.diff(positions) == 1).all())):
+        start = positions[0] if n else 0
+        return data.iloc[start:start + n]
+    return data.take(positions)
+
+class SelectedRows:
+    """
+    Look up the columns of df at the given row positions, like Wrap.df does for a Wrap with a selection vector.
+    A column is only gathered when an expression reads it
+    """
+    def __init__(self, df, positions):
+        self.df = df
+        self.positions = positions
+        self.gathered = dict()
+
+    def __contains__(self, key):
+        return key in self.df.columns
+
+    def __getitem__(self, key):
+        if key not in self.gathered:
+            if key not in self.df.columns:
+                raise KeyError(key)
+            self.gathered[key] = take_rows(self.df[key], self.positions)
+        return self.gathered[key]
+
+def _as_mask(mask, w):
+    """
+    the boolean array of the rows of w which mask selects.  A Series is lined up with the rows by its index, 
+    as df[mask] does, e.g. for a Series passed in with let
+    """
+    if isinstance(mask, pd.Series):
+        index = w._index()
+        if not mask.index.equals(index):
+            mask = mask.reindex(index)
+        return mask.to_numpy(dtype=bool, na_value=False)
+    mask = np.asarray(mask, dtype=bool)
+    if mask.ndim == 0:
+        # e.g. where true
+        return np.full(w._num_rows(), bool(mask))
+    return mask
+
 class Take(TabularOperator):
     def __init__(self, n):
         self.n = n
+
+    def __str__(self):
+        return "take " + str(self.n)
     
-    def _evaluate_top(self, df, vars):
-        n = self.n.evaluate(vars)
-        return df.head(n)   
+    def evaluate_query(self, w):
+        n = evaluate_compiled(self.n, w._get_var_map())
+        num_rows = w._num_rows()
+        if n < 0:
+            # like df.head, all but the last -n rows
+            n = max(num_rows + n, 0)
+        return w._select(np.arange(min(n, num_rows)))
+
+def _where(w, predicate):
+    mask = evaluate_compiled(predicate, w._get_var_map())
+    return w._select(np.flatnonzero(_as_mask(mask, w)))
 
 class Where(TabularOperator):
     def __init__(self, predicate):
         self.predicate = predicate
+
+    def __str__(self):
+        return "where " + str(self.predicate)
     
-    def _evaluate_top(self, df, vars):
-        mask = self.predicate.evaluate(vars)
+    def evaluate_query(self, w):
+        return _where(w, self.predicate)
+
+class FusedWhere(TabularOperator):
+    """
+    Several where clauses in a row, e.g. where A > 1 | where B has "x".
+
+    Each predicate is only evaluated on the rows which passed the ones before it.  The rows are gathered once, 
+    when they are needed after the last one
+    """
+    def __init__(self, predicates):
+        self.predicates = predicates
+
+    def __str__(self):
+        return " | ".join("where " + str(p) for p in self.predicates)
+
+    def evaluate_query(self, w):
+        for predicate in self.predicates:
+            w = _where(w, predicate)
+        return w
+
+class WhereTake(TabularOperator):
+    """
+    where ... | take n, which stops once n rows have passed.  The rows are checked in chunks of increasing size.
+
+    Each row must pass or fail regardless of the other rows in its chunk, so the optimizer only uses this for row wise predicates
+    """
+    first_chunk_size = 1024
+
+    def __init__(self, predicates, n):
+        self.predicates = predicates
+        self.n = n
+
+    def __str__(self):
+        return " | ".join(["where " + str(p) for p in self.predicates] + ["take " + str(self.n)])
+
+    def evaluate_query(self, w):
+        n = evaluate_compiled(self.n, w._get_var_map())
+        if n < 0:
+            return Take(self.n).evaluate_query(FusedWhere(self.predicates).evaluate_query(w))
+
+        num_rows = w._num_rows()
+        matches = [np.arange(0)]
+        found = 0
+        start = 0
+        chunk_size = max(self.first_chunk_size, 4 * n)
+        while start < num_rows and found < n:
+            rows = np.arange(start, min(start + chunk_size, num_rows))
+            for predicate in self.predicates:
+                chunk = w._select(rows)
+                mask = evaluate_compiled(predicate, chunk._get_var_map())
+                rows = rows[_as_mask(mask, chunk)]
+            matches.append(rows)
+            found += len(rows)
+            start += chunk_size
+            chunk_size *= 4
+
+        return w._select(np.concatenate(matches)[:n])
+
+def _evaluate_simple_expressions(parsed_list, variable_map):
+    """
+    evaluate the arguments of an operator together, so the subexpressions they share are evaluated once.
+    return the SimpleExpression for each argument and its result
+    """
+    simple_expressions = [SimpleExpression(parsed) for parsed in parsed_list]
+    compiled = compile_expressions([se.expression for se in simple_expressions])
+    return [(se, c(variable_map)) for se, c in zip(simple_expressions, compiled)]
 
-        return df[mask].copy()
 class Extend(TabularOperator):
     def __init__(self, args):
         self.args = args
+
+    def __str__(self):
+        return "extend " + _join_str(self.args)
     
     def _evaluate_top(self, df, var_map):
-        dfnew = df.copy(deep=False)
-        for parsed in self.args:
-            se = SimpleExpression(parsed)
-            name = se.get_name()
-            result = se.evaluate(var_map)
-            dfnew[name] = result
+        new_columns = dict()
+        for se, result in _evaluate_simple_expressions(self.args, var_map):
+            new_columns[se.get_name()] = result
         
-        return dfnew
+        return replace_temp_column_names(with_columns(df, new_columns))
 
 class Summarize(TabularOperator):
     def __init__(self, aggregates, by):
         self.aggregates = aggregates
         self.by = by
+
+    def __str__(self):
+        by = ""
+        if self.by:
+            by = " by " + _join_str(self.by)
+        return "summarize " + _join_str(self.aggregates) + by
     
     def _evaluate_top(self, df, variable_map):
         dftemp = pd.DataFrame(index=df.index.copy())
 
         group_by_col_names = []
+        by_expressions = []
         for parsed in self.by:
-            col_name, series = _evaluate_and_get_name(parsed, variable_map)
+            se = SimpleExpression(parsed)
+            col_name = se.get_name()
             if col_name in group_by_col_names:
                 raise Exception("Column can only appear once in group by expression " + col_name)
 
             group_by_col_names.append(col_name)
-            dftemp[col_name] = series
+            by_expressions.append(se.expression)
         
-        all_columns = set(df.columns) - set(group_by_col_names)
+        # in the order of df, so that any(*) and arg_max(A, *) output the columns in that order
+        all_columns = [c for c in df.columns if c not in group_by_col_names]
 
         args = [create_aggregate(a, all_columns) for a in self.aggregates]
 
+        # the group by columns and the inputs of all the aggregates are evaluated together, 
+        # so the subexpressions they share, e.g. A / B in avg(A / B), max(A / B), are evaluated once
+        column_inputs = list(zip(group_by_col_names, by_expressions))
         for arg in args:
-            for col_name, col_value in arg.evaluate_column_inputs(variable_map):
-                if col_name not in dftemp.columns:
-                    dftemp[col_name] = col_value
+            column_inputs += arg.get_column_inputs()
+
+        compiled = compile_expressions([definition for col_name, definition in column_inputs])
+        for (col_name, definition), c in zip(column_inputs, compiled):
+            if col_name not in dftemp.columns:
+                dftemp[col_name] = c(variable_map)
 
         if len(group_by_col_names) > 0:
             grouped = dftemp.groupby(group_by_col_names)
@@ -142,86 +426,142 @@ class Summarize(TabularOperator):
             # it's allowed to pass nothing as group by.  In which case the aggregate will 
             # operate on the entire series
             grouped = dftemp
-        dfnew = pd.DataFrame()
 
+        reduced = reduce_together(args, grouped, group_by_col_names)
+
+        output = dict()
         for arg in args:
-            result = arg.apply(grouped, variable_map)
+            result = arg.apply(grouped, variable_map, reduced)
             for col, series in result:
-                col = ensure_column_name_unique(dfnew, col)
-                dfnew[col] = series
+                col = ensure_column_name_unique(output, col)
+                output[col] = series
+
+        # the output columns are aligned to the first one, and assembled into a DataFrame together
+        if output:
+            dfnew = pd.DataFrame(output, index=next(iter(output.values())).index)
+        else:
+            dfnew = pd.DataFrame()
         
         if len(group_by_col_names) > 0:
             dfnew = dfnew.reset_index()
         
-        return dfnew
-
-def _sort(df, sort_columns, variable_map):
-    dfnew = df.copy(deep=False)
-
-    col_names = ["__tempcol_" + str(i) for i in range(len(sort_columns))]
+        return replace_temp_column_names(dfnew)
+
+def _sort_keys(w, sort_columns):
+    """
+    evaluate the sort expressions.  return a DataFrame with one column per expression, numbered by row position, 
+    and whether each one is ascending.  Only the columns used by the sort expressions are gathered
+    """
+    var_map = w._get_var_map()
+    keys = pd.DataFrame(index=pd.RangeIndex(w._num_rows()))
     asc = [False] * len(sort_columns)
 
-    var_map = variable_map
     for i, expr in enumerate(sort_columns):
-        col = col_names[i]
-        series = expr.evaluate(var_map)
-        dfnew[col] = series
+        series = evaluate_compiled(expr, var_map)
+        if isinstance(series, pd.Series):
+            # the keys are matched to the rows by position, not by the index
+            series = series.array
+        keys["__tempcol_" + str(i)] = series
         if expr.is_asc():
             asc[i] = True
         # if expr.is_desc():
         #     asc[i] = False
-    
-    dfnew = dfnew.sort_values(col_names, ascending=asc)
 
-    for c in col_names:
-        del dfnew[c]
-    
-    return dfnew
+    return keys, asc
+
+def _sort_order(keys, asc):
+    # a stable sort, so that rows which tie keep their order.  Then top gives the same rows as sort | take
+    return keys.sort_values(list(keys.columns), ascending=asc, kind="stable").index.to_numpy()
+
+def _sort(w, sort_columns):
+    """
+    sort the rows by reordering the selection vector
+    """
+    keys, asc = _sort_keys(w, sort_columns)
+    return w._select(_sort_order(keys, asc))
+
+def _can_select_top(series):
+    return not pd.api.types.is_bool_dtype(series) and (
+        pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series) or pd.api.types.is_timedelta64_dtype(series))
+
+def _top(w, n, sort_columns):
+    """
+    the first n rows in the sort order, without sorting all of the rows
+    """
+    keys, asc = _sort_keys(w, sort_columns)
+
+    first = keys.iloc[:, 0]
+    if 0 <= n < len(keys) and _can_select_top(first) and first.count() >= n:
+        # Select the n best values of the first key in linear time.  keep="all" also keeps the rows which tie with 
+        # the n-th one, so the other keys can break the ties.  Nulls sort last, so they can't be among the n best
+        if asc[0]:
+            best = first.nsmallest(n, keep="all")
+        else:
+            best = first.nlargest(n, keep="all")
+        keys = keys.loc[np.sort(best.index.to_numpy())]
+
+    return w._select(_sort_order(keys, asc)[:n])
 
 class Sort(TabularOperator):
     def __init__(self, sort_columns):
         self.sort_columns = sort_columns
+
+    def __str__(self):
+        return "sort by " + _join_str(self.sort_columns)
     
-    def _evaluate_top(self, df, variable_map):
-        return _sort(df, self.sort_columns, variable_map)
+    def evaluate_query(self, w):
+        return _sort(w, self.sort_columns)
 
 class Top(TabularOperator):
     def __init__(self, n, sort_columns):
         self.n = n
         self.sort_columns = sort_columns
+
+    def __str__(self):
+        return "top {} by {}".format(self.n, _join_str(self.sort_columns))
     
     def evaluate_query(self, w):
-        pipe = Pipe([Sort(self.sort_columns), Take(self.n)])
-        return pipe.evaluate_query(w)
+        n = evaluate_compiled(self.n, w._get_var_map())
+        return _top(w, n, self.sort_columns)
 
 class Project(TabularOperator):
     def __init__(self, columns):
         self.columns = columns
+
+    def __str__(self):
+        return "project " + _join_str(self.columns)
     
-    def _evaluate_top(self, df, variable_map):
+    def evaluate_query(self, w):
+        # project doesn't need the rows of w to be gathered, only the columns its expressions use
+        return w._copy(self._project(w._get_var_map()))
+
+    def _project(self, variable_map):
         dfnew = pd.DataFrame()
 
-        for parsed in self.columns:
-            se = SimpleExpression(parsed)
-            result = se.evaluate(variable_map)
+        for se, result in _evaluate_simple_expressions(self.columns, variable_map):
             dfnew[se.get_name()] = result
         
-        return dfnew
+        return replace_temp_column_names(dfnew)
 
 class ProjectAway(TabularOperator):
     def __init__(self, column_name_or_pattern_list):
         self.column_name_or_pattern_list = column_name_or_pattern_list
+
+    def __str__(self):
+        return "project-away " + _join_str(self.column_name_or_pattern_list)
     
     def _evaluate_top(self, df, variable_map):
-        dfnew = df.copy()
-        for column in parse_column_name_or_pattern_list(self.column_name_or_pattern_list, df):
-            del dfnew[column]
+        columns_to_remove = set(parse_column_name_or_pattern_list(self.column_name_or_pattern_list, df))
+        columns = [c for c in df.columns if c not in columns_to_remove]
 
-        return dfnew
+        return select_columns(df, columns)
     
 class ProjectKeep(TabularOperator):
     def __init__(self, column_name_or_pattern_list):
         self.column_name_or_pattern_list = column_name_or_pattern_list
+
+    def __str__(self):
+        return "project-keep " + _join_str(self.column_name_or_pattern_list)
     
     def _evaluate_top(self, df, variable_map):
         columns_to_keep = set(parse_column_name_or_pattern_list(self.column_name_or_pattern_list, df))
@@ -229,25 +569,28 @@ class ProjectKeep(TabularOperator):
         # maintain the original orderin of the columns
         columns = [c for c in df.columns if c in columns_to_keep]
 
-        dfnew = df[columns].copy()
-
-        return dfnew
+        return select_columns(df, columns)
 
 class ProjectReorder(TabularOperator):
     def __init__(self, column_name_or_pattern_list):
         self.column_name_or_pattern_list = column_name_or_pattern_list
+
+    def __str__(self):
+        return "project-reorder " + _join_str(self.column_name_or_pattern_list)
     
     def _evaluate_top(self, df, variable_map):
         specified_cols = parse_column_name_or_pattern_list(self.column_name_or_pattern_list, df)
         # unspecified columns should be put at the back of the list
         new_cols = remove_duplicates_maintain_order(specified_cols + list(df.columns))
-        dfnew = df[new_cols].copy()
 
-        return dfnew
+        return select_columns(df, new_cols)
 
 class ProjectRename(TabularOperator):
     def __init__(self, simple_assignments):
         self.simple_assignments = simple_assignments
+
+    def __str__(self):
+        return "project-rename " + _join_str(self.simple_assignments)
     
     def _evaluate_top(self, df, variable_map):
         col_map = dict()
@@ -260,12 +603,16 @@ class ProjectRename(TabularOperator):
             if oldcol not in df.columns:
                 raise KeyError("Could not find column: " + oldcol)
         
-        dfnew = df.rename(columns=col_map).copy()
-        return dfnew
+        return rename_columns(df, col_map)
 
 class Distinct(TabularOperator):
     def __init__(self, columnsOrStar):
         self.columnsOrStar = columnsOrStar
+
+    def __str__(self):
+        if self.columnsOrStar == "*":
+            return "distinct *"
+        return "distinct " + _join_str(self.columnsOrStar)
     
     def _evaluate_top(self, df, variable_map):
         if self.columnsOrStar == "*":
@@ -276,23 +623,27 @@ class Distinct(TabularOperator):
         # It would be extra work to limit it to only column names, and supporting arbitrary expressions seems nice, so I will leave it
 
         dfnew = pd.DataFrame()
-        for parsed in self.columnsOrStar:
-            se = SimpleExpression(parsed)
-            name = se.get_name()
-            series = se.evaluate(variable_map)
-            dfnew[name] = series
+        for se, series in _evaluate_simple_expressions(self.columnsOrStar, variable_map):
+            dfnew[se.get_name()] = series
         
-        return dfnew.drop_duplicates()
+        return replace_temp_column_names(dfnew.drop_duplicates())
 
 class Count(TabularOperator):
-    def _evaluate_top(self, df, variable_map):
-        count = df.shape[0]
+    def __str__(self):
+        return "count"
+
+    def evaluate_query(self, w):
+        return w._copy(self._count(w._num_rows()))
 
+    def _count(self, count):
         dfnew = pd.DataFrame()
         dfnew["Count"] = [count]
         return dfnew
 
 class GetSchema(TabularOperator):
+    def __str__(self):
+        return "getschema"
+
     def _evaluate_top(self, df, variable_map):
         d2 = pd.DataFrame()
         d2["ColumnName"] = df.columns
@@ -305,6 +656,9 @@ class Join(TabularOperator):
     def __init__(self, right, kwargs):
         self.right = right
         self.kwargs = kwargs
+
+    def __str__(self):
+        return "join {} ({})".format(self.kwargs, self.right)
     
     def evaluate_query(self, w):
         right = self.right.evaluate_query(w)
@@ -314,6 +668,9 @@ class Union(TabularOperator):
     def __init__(self, right_tables, kwargs):
         self.right_tables = right_tables
         self.kwargs = kwargs
+
+    def __str__(self):
+        return "union {} {}".format(self.kwargs, _join_str("(" + str(t) + ")" for t in self.right_tables))
     
     def evaluate_query(self, w):
         tables = []
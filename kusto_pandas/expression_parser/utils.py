@@ -1,3 +1,6 @@
+import threading
+
+import numpy as np
 import pandas as pd
 
 def is_series(s):
@@ -46,4 +49,66 @@ def get_apply_elementwise_method(method):
             result = dftemp.apply(wrap, axis=1)
             return result
     
-    return apply_elementwise
\ No newline at end of file
+    return apply_elementwise
+
+_jit_lock = threading.Lock()
+# the ufuncs compiled by numba, keyed by the python function.  Each one is compiled again for every new combination of 
+# argument dtypes, and keeps those compiled versions
+_jit_ufuncs = dict()
+# the functions and argument dtypes which numba couldn't compile
+_jit_failures = set()
+_numba = None
+
+def _get_numba():
+    global _numba
+    if _numba is None:
+        try:
+            import numba
+            _numba = numba
+        except ImportError:
+            _numba = False
+    return _numba
+
+def _is_jit_argument(arg):
+    if is_series(arg):
+        return isinstance(arg.dtype, np.dtype) and arg.dtype.kind in "biuf"
+    return isinstance(arg, (bool, int, float, np.bool_, np.integer, np.floating))
+
+def _get_jit_ufunc(method):
+    with _jit_lock:
+        if method not in _jit_ufuncs:
+            _jit_ufuncs[method] = _get_numba().vectorize(method)
+        return _jit_ufuncs[method]
+
+def get_jit_elementwise_method(method):
+    """
+    Like get_apply_elementwise_method, but method is compiled with numba into a ufunc, which runs at C speed rather 
+    than once per row in python.  It is compiled once for each combination of argument dtypes.
+
+    If numba isn't installed, an argument isn't numeric, or numba can't compile method, it is applied elementwise as usual
+    """
+    apply_elementwise = get_apply_elementwise_method(method)
+
+    def jit_elementwise(*args):
+        first_series = first_series_or_none(args)
+        if not _get_numba() or first_series is None or not all(_is_jit_argument(a) for a in args):
+            return apply_elementwise(*args)
+
+        if any(is_series(a) and not a.index.equals(first_series.index) for a in args):
+            # pandas would align them
+            return apply_elementwise(*args)
+
+        arrays = [a.to_numpy() if is_series(a) else np.asarray(a) for a in args]
+        key = (method, tuple(a.dtype for a in arrays))
+        if key in _jit_failures:
+            return apply_elementwise(*args)
+
+        try:
+            result = _get_jit_ufunc(method)(*arrays)
+        except Exception:
+            # e.g. the method uses python objects which numba doesn't support
+            _jit_failures.add(key)
+            return apply_elementwise(*args)
+        return pd.Series(result, index=first_series.index)
+
+    return jit_elementwise
@@ -1,139 +1,95 @@
+import numpy as np
 import pandas as pd
 from pandas.core.frame import DataFrame
 
-from .expression_parser import parse_expression_query, TABLE_SELF
+from . import expression_parser
+from .expression_parser import TABLE_SELF
+from .expression_parser.expression_parser_types import Assignment, Var
+from .expression_parser import tabular_operators as ops
+from .expression_parser import optimizer
 from .methods import get_methods
-from ._render import render
-from .expression_parser._simple_expression import replace_temp_column_names
-from .expression_parser.utils import get_apply_elementwise_method
+from .expression_parser.utils import get_apply_elementwise_method, get_jit_elementwise_method
+
+class Scope:
+    """
+    The names which can be used in an expression: the columns of the table first, then the values, which are the methods
+    and let variables merged into one dictionary.  Each name is found with at most two lookups, and no exceptions 
+    are raised and caught along the way
+    """
+    def __init__(self, columns, values):
+        # columns is a DataFrame or SelectedRows
+        self.columns = columns
+        self.values = values
+        # the results of the subexpressions which occur more than once in an operator, see compiler.compile_expressions
+        self.shared_results = dict()
 
-class MultiDict:
-    def __init__(self, dicts):
-        self.dicts = dicts
-    
     def __getitem__(self, key):
-        for d in self.dicts:
-            try:
-                return d[key]
-            except KeyError:
-                pass
-        
-        raise KeyError(key)
-
-def _serialize_named_expressions(kwargs):
-    if kwargs is None:
-        return ""
-
-    return ", ".join([str(k) + " = " + str(v) for k, v in kwargs.items()])
-
-def _serialize_expressions(args, kwargs = None):
-    expr = " "
-
+        if key in self.columns:
+            return self.columns[key]
+        return self.values[key]
+
+def _parse_fragment(text, root):
+    # fragments are cached by the parser, so repeated fluent calls don't parse again
+    return expression_parser.parse_expression(str(text).strip(), debug=False, root=root)
+
+def _parse_list(args, root="assignmentList"):
+    """
+    args can be a string of comma separated expressions, or a list of such strings
+    """
     if isinstance(args, str):
-        args_expr = args
-    else:
-        args_expr = ", ".join([str(a) for a in args])
+        args = [args]
 
-    kwargs_expr = _serialize_named_expressions(kwargs)
-
-    expr += args_expr
-
-    if args_expr and kwargs_expr:
-        expr += ", "
-    
-    expr += kwargs_expr
-    return expr
-
-
-class Wrap:
-    def __init__(self, df):
-        self.df = df
-        # let_statements is a list of dictionaries
-        self.let_statements = []
-    
-    def _repr_html_(self):
-        return self.df._repr_html_()
-
-    def _copy(self, df):
-        df = replace_temp_column_names(df)
-        w = Wrap(df)
-        w.let_statements = list(self.let_statements)
-        return w
-
-    def _get_var_map(self):
-        return MultiDict([self.df, get_methods()] + self.let_statements)
-    
-    def __str__(self):
-        return str(self.df)
-    
-    def _execute_tabular_operator(self, expression):
-        expression = TABLE_SELF + " | " + expression
-        return self.execute(expression)
-    
-    def _set_active_table(self, identifier):
-        # todo: don't look at column names
-        active_table = self._get_var_map()[identifier]
-        
-        if isinstance(active_table, pd.DataFrame):
-            active_table = Wrap(active_table)
-        elif isinstance(active_table, Wrap):
-            active_table = active_table._copy(active_table.df)
+    parsed = []
+    for arg in args:
+        if isinstance(arg, (list, tuple)):
+            parsed += _parse_list(arg, root=root)
         else:
-            raise Exception("expected table but got " + str(active_table))
+            parsed += _parse_fragment(arg, root)
+    return parsed
 
-        active_table.let_statements += self.let_statements
-        return active_table
-    
-    def _remove_self_from_let_statements(self):
-        for d in self.let_statements:
-            if TABLE_SELF in d:
-                del d[TABLE_SELF]
+def _parse_named_expressions(kwargs, root="expression"):
+    return [Assignment(Var(str(k)), _parse_fragment(v, root)) for k, v in kwargs.items()]
 
-    def execute(self, expression):
-        """
-        execute a Kusto query
-        
-        use `self` to refer to the table in this object
+class TabularOperatorMethods:
+    """
+    The fluent interface to the tabular operators, e.g. w.where("A > 1").project("A")
 
-        w.execute("self | where A > 5 | take 10")
-        """
-        if TABLE_SELF in self.df.columns:
-            raise Exception("{} is not allowed as a column name because it is a reserved keyword (sorry. this can be imroved I'm sure)".format(TABLE_SELF))
-        
-        w = self._copy(self.df)
-        # use insert instead of append so new additions overwrite old ones
-        w.let_statements.insert(0, {TABLE_SELF: self.df})
+    Each method builds the tabular operator and passes it to _evaluate_tabular_operator.
+    Wrap evaluates it immediately and LazyWrap adds it to the plan.
+    """
+    def _evaluate_tabular_operator(self, tabular_operator):
+        raise NotImplementedError()
 
-        parsed = parse_expression_query(expression)
-        result = parsed.evaluate_query(w)
-        result._remove_self_from_let_statements()
-        return result
+    def _execute_tabular_operator(self, expression):
+        tabular_operator = _parse_fragment(expression, "tabularOperator")
+        return self._evaluate_tabular_operator(tabular_operator)
 
     def let(self, **kwargs):
-        """
-        define variables or methods to be used in kusto expressions
+        raise NotImplementedError()
 
-        Methods defined here will act on the entire series.  If you want them to act elementwise
-        then use let_elementwise
-        """
-        # note: this supports passing in arbitrary python functions, functionality which goes beyond pure Kusto.
-        # For that reason we can't implement it using _execute_tabular_operator because the functions can't be serialized to a string
-        w = self._copy(self.df)
-        w.let_statements.insert(0, (kwargs))
-        return w
-    
-    def let_elementwise(self, **kwargs):
+    def let_elementwise(self, jit=False, **kwargs):
         """
         methods passed in here will act on the elements of the series rather than on the entire series
+
+        With jit=True, methods on numeric columns are compiled with numba, if it is installed
         """
         wrapped_methods = dict()
         for name, method in kwargs.items():
             if not callable(method):
                 raise Exception(name + " is not callable.  let_elementwise only accepts methods")
 
-            wrapped_methods[name] = get_apply_elementwise_method(method)
+            if jit:
+                wrapped_methods[name] = get_jit_elementwise_method(method)
+            else:
+                wrapped_methods[name] = get_apply_elementwise_method(method)
         return self.let(**wrapped_methods)        
 
+    def let_jit(self, **kwargs):
+        """
+        the same as let_elementwise(jit=True, ...)
+        """
+        return self.let_elementwise(jit=True, **kwargs)
+
     def project(self, *cols, **renamed_cols):
         """
         all of the following are acceptable
@@ -150,25 +106,24 @@ class Wrap:
         
         w.project("A, Bnew = B+A")
         """
-        expr = "project " + _serialize_expressions(cols, renamed_cols)
-
-        return self._execute_tabular_operator(expr)
+        columns = _parse_list(cols) + _parse_named_expressions(renamed_cols)
+        return self._evaluate_tabular_operator(ops.Project(columns))
 
     def project_away(self, *cols):
-        expr = "project-away " + _serialize_expressions(cols)
-        return self._execute_tabular_operator(expr)
+        columns = _parse_list(cols, root="columnNameOrPatternList")
+        return self._evaluate_tabular_operator(ops.ProjectAway(columns))
 
     def project_keep(self, *cols):
-        expr = "project-keep " + _serialize_expressions(cols)
-        return self._execute_tabular_operator(expr)
+        columns = _parse_list(cols, root="columnNameOrPatternList")
+        return self._evaluate_tabular_operator(ops.ProjectKeep(columns))
 
     def project_rename(self, *args, **kwargs):
-        expr = "project-rename " + _serialize_expressions(args, kwargs)
-        return self._execute_tabular_operator(expr)
+        assignments = _parse_list(args, root="simpleAssignmentList") + _parse_named_expressions(kwargs, root="identifier")
+        return self._evaluate_tabular_operator(ops.ProjectRename(assignments))
 
     def project_reorder(self, *cols):
-        expr = "project-reorder " + _serialize_expressions(cols)
-        return self._execute_tabular_operator(expr)
+        columns = _parse_list(cols, root="columnNameOrPatternList")
+        return self._evaluate_tabular_operator(ops.ProjectReorder(columns))
 
     def summarize(self, aggregates, by=None):
         """
@@ -184,24 +139,26 @@ class Wrap:
 
 
         """
-        expr = "summarize " + _serialize_expressions(aggregates)
+        if by is None and isinstance(aggregates, str):
+            # the string can contain the by clause
+            return self._execute_tabular_operator("summarize " + aggregates)
 
+        by_columns = []
         if by is not None:
-            expr += " by " + _serialize_expressions(by)
+            by_columns = _parse_list(by)
 
-        return self._execute_tabular_operator(expr)
+        return self._evaluate_tabular_operator(ops.Summarize(_parse_list(aggregates), by_columns))
 
     def extend(self, *args, **kwargs):
-        expr = "extend " + _serialize_expressions(args, kwargs)
-        return self._execute_tabular_operator(expr)
+        columns = _parse_list(args) + _parse_named_expressions(kwargs)
+        return self._evaluate_tabular_operator(ops.Extend(columns))
     
     def where(self, condition):
-        expr = "where " + condition
-        return self._execute_tabular_operator(expr)
+        predicate = _parse_fragment(condition, "expression")
+        return self._evaluate_tabular_operator(ops.Where(predicate))
     
     def take(self, n):
-        expr = "take " + str(n)
-        return self._execute_tabular_operator(expr)
+        return self._evaluate_tabular_operator(ops.Take(_parse_fragment(n, "expression")))
     
     def limit(self, n):
         return self.take(n)
@@ -216,8 +173,7 @@ class Wrap:
         by can be a column name, or an expression built from columns e.g. (strlen(country))
             or it can be a list of such expressions
         """
-        expr = "sort by " + _serialize_expressions(by)
-        return self._execute_tabular_operator(expr)
+        return self._evaluate_tabular_operator(ops.Sort(_parse_list(by, root="sortColumnList")))
 
     def top(self, n, by=None):
         """
@@ -230,17 +186,211 @@ class Wrap:
 
         w.top("5 by A asc")
         """
-        expr = "top " + str(n)
-        if by is not None:
-            expr += " by " + _serialize_expressions(by)
-        return self._execute_tabular_operator(expr)
+        if by is None:
+            return self._execute_tabular_operator("top " + str(n))
+
+        sort_columns = _parse_list(by, root="sortColumnList")
+        return self._evaluate_tabular_operator(ops.Top(_parse_fragment(n, "expression"), sort_columns))
+
+    def count(self):
+        return self._evaluate_tabular_operator(ops.Count())
+
+    def distinct(self, *args):
+        if list(args) == ["*"]:
+            return self._evaluate_tabular_operator(ops.Distinct("*"))
+        return self._evaluate_tabular_operator(ops.Distinct(_parse_list(args)))
+
+    def getschema(self):
+        return self._evaluate_tabular_operator(ops.GetSchema())
+
+class Wrap(TabularOperatorMethods):
+    """
+    A DataFrame which can be queried with Kusto tabular operators, e.g. Wrap(df).where("A > 1").project("A")
+
+    The DataFrame passed in is never modified.  The operators don't copy data which they don't change, so the result of 
+    a query can share column data with its input, and many queries can run against one large table without copying it.
+    Modifying the result in place can therefore modify the input, unless pandas copy on write is enabled
+    (pd.options.mode.copy_on_write = True, the default from pandas 3.0).  Use df.copy() first otherwise
+    """
+    def __init__(self, df):
+        self._df = df
+        # Filters and sorts don't copy the rows of the table.  Instead they keep the positions of the rows in _rows, 
+        # a selection vector, and the rows are only gathered when df is needed.  None means all of the rows of _df
+        self._rows = None
+        self._gathered = None
+        # let_statements is a list of dictionaries.  The first one which has a name wins.
+        # The list can be shared between instances of Wrap, so replace it rather than modifying it in place
+        self.let_statements = []
+        # (let_statements, the values in the scope of expressions).  See _get_scope_values
+        self._scope_values = None
+
+    @property
+    def df(self):
+        if self._rows is None:
+            return self._df
+        if self._gathered is None:
+            self._gathered = ops.take_rows(self._df, self._rows)
+        return self._gathered
+
+    @df.setter
+    def df(self, df):
+        self._df = df
+        self._rows = None
+        self._gathered = None
+
+    def _num_rows(self):
+        if self._rows is None:
+            return len(self._df)
+        return len(self._rows)
+
+    def _index(self):
+        if self._rows is None:
+            return self._df.index
+        return self._df.index[self._rows]
+    
+    def _repr_html_(self):
+        return self.df._repr_html_()
+
+    def _copy(self, df):
+        w = Wrap(df)
+        w.let_statements = self.let_statements
+        w._scope_values = self._scope_values
+        return w
+
+    def _select(self, rows=None):
+        """
+        return a copy of this Wrap with only the rows at the positions in rows, without gathering the rows.
+        rows=None keeps all of them
+        """
+        w = Wrap(self._df)
+        if rows is None:
+            rows = self._rows
+        elif self._rows is not None:
+            rows = self._rows[rows]
+        w._rows = rows
+        w._gathered = self._gathered if rows is self._rows else None
+        w.let_statements = self.let_statements
+        w._scope_values = self._scope_values
+        return w
+
+    def _get_scope_values(self):
+        """
+        the methods and let variables merged into one dictionary.  It is built once for each list of let statements
+        and shared by the Wraps which are derived from this one
+        """
+        scope_values = self._scope_values
+        if scope_values is None or scope_values[0] is not self.let_statements:
+            values = dict()
+            # the built in methods take precedence over the let variables, and earlier let statements over later ones
+            for d in reversed([get_methods()] + self.let_statements):
+                values.update(d)
+            scope_values = (self.let_statements, values)
+            self._scope_values = scope_values
+        return scope_values[1]
+
+    def _get_var_map(self):
+        if self._rows is None or self._gathered is not None:
+            columns = self.df
+        else:
+            columns = ops.SelectedRows(self._df, self._rows)
+        return Scope(columns, self._get_scope_values())
+    
+    def __str__(self):
+        return str(self.df)
+    
+    def _evaluate_tabular_operator(self, tabular_operator):
+        return tabular_operator.evaluate_query(self)
+    
+    def _set_active_table(self, identifier):
+        # todo: don't look at column names
+        active_table = self._get_var_map()[identifier]
         
+        if isinstance(active_table, pd.DataFrame):
+            active_table = Wrap(active_table)
+        elif isinstance(active_table, Wrap):
+            active_table = active_table._select()
+        else:
+            raise Exception("expected table but got " + str(active_table))
+
+        active_table.let_statements = active_table.let_statements + self.let_statements
+        return active_table
+    
+    def _remove_let_statement(self, let_statement):
+        # remove by identity rather than modifying the dictionary in place because
+        # the dictionaries can be shared with other instances of Wrap
+        self.let_statements = [d for d in self.let_statements if d is not let_statement]
+
+    def execute(self, expression):
+        """
+        execute a Kusto query
+        
+        use `self` to refer to the table in this object
+
+        w.execute("self | where A > 5 | take 10")
+        """
+        parsed = expression_parser.parse_expression_query(expression)
+        return self._execute_parsed(parsed)
+
+    def _execute_parsed(self, parsed):
+        if TABLE_SELF in self.df.columns:
+            raise Exception("{} is not allowed as a column name because it is a reserved keyword (sorry. this can be imroved I'm sure)".format(TABLE_SELF))
+        
+        w = self._copy(self.df)
+        # put it first so that it overrides earlier definitions of self
+        self_statement = {TABLE_SELF: self.df}
+        w.let_statements = [self_statement] + w.let_statements
+
+        result = parsed.evaluate_query(w)
+        result._remove_let_statement(self_statement)
+        return result
+
+    def lazy(self):
+        """
+        Return a LazyWrap of this table.  Tabular operators on it are collected into a plan and 
+        only run when the result is needed, e.g. by collect() or .df
+
+        w.lazy().extend(C="A * 2").where("B > 1").take(10).collect()
+        """
+        return LazyWrap(self)
+
+    def let(self, **kwargs):
+        """
+        define variables or methods to be used in kusto expressions
+
+        Methods defined here will act on the entire series.  If you want them to act elementwise
+        then use let_elementwise
+        """
+        # note: this supports passing in arbitrary python functions, functionality which goes beyond pure Kusto.
+        # For that reason we can't implement it using _execute_tabular_operator because the functions can't be serialized to a string
+        w = self._select()
+        w.let_statements = [kwargs] + w.let_statements
+        return w
+    
     def join(self, right, on=None, left_on=None, right_on=None, kind="inner"):
         if isinstance(right, Wrap):
             right = right.df
 
+        left = self.df
+        if kind == "inner":
+            # merge in pandas < 2.2 groups the rows of an inner join by key, in the order in which the keys first appear,
+            # and pandas 3 doesn't keep the order of the matching right rows.  Order the rows by the left row and then by
+            # the right row instead, so that the order doesn't depend on which rows were filtered out before the join
+            left_position, right_position = "__left_position", "__right_position"
+            while any(p in df.columns for p in (left_position, right_position) for df in (left, right)):
+                left_position, right_position = "_" + left_position, "_" + right_position
+            left = left.assign(**{left_position: np.arange(len(left))})
+            right = right.assign(**{right_position: np.arange(len(right))})
+
         # fix suffixes to align with what kusto does in case of name conflict
-        dfnew = self.df.merge(right=right, how=kind, on=on, left_on=left_on, right_on=right_on, suffixes=("", "_y"))
+        dfnew = left.merge(right=right, how=kind, on=on, left_on=left_on, right_on=right_on, suffixes=("", "_y"))
+
+        if kind == "inner":
+            left_order = dfnew[left_position].to_numpy()
+            right_order = dfnew[right_position].to_numpy()
+            dfnew = dfnew.drop(columns=[left_position, right_position])
+            order = np.lexsort((right_order, left_order))
+            if not (order == np.arange(len(order))).all():
+                dfnew = dfnew.take(order).reset_index(drop=True)
 
         return self._copy(dfnew)
     
@@ -257,11 +407,13 @@ class Wrap:
         return self._copy(dfnew)
     
     def render(self, visualization=None, **kwargs):
-        return render(self, visualization=visualization, **kwargs) 
+        # imported here because plotting is rarely used and not needed to run queries
+        from ._render import render
+        return render(self, visualization=visualization, **kwargs)
 
     def to_clipboard(self, name=None):
         # this is not part of Kusto, but I find it very useful
-        df = self.df.copy()
+        df = self.df.copy(deep=False)
         if isinstance(df, pd.DataFrame):
             df.to_clipboard(index_label=df.columns.name)
         else:
@@ -270,15 +422,96 @@ class Wrap:
             df.to_clipboard(header=True)
                 
         return self
-    
-    def count(self):
-        expr = "count"
-        return self._execute_tabular_operator(expr)
 
-    def distinct(self, *args):
-        expr = "distinct " + _serialize_expressions(args)
-        return self._execute_tabular_operator(expr)
+def _as_plan(table):
+    """
+    return the plan which produces table, which can be a LazyWrap, a Wrap or a DataFrame
+    """
+    if isinstance(table, LazyWrap):
+        return table.get_plan()
+    if isinstance(table, Wrap):
+        return ops.Table(table)
+    return ops.Table(Wrap(table))
+
+class LazyWrap(TabularOperatorMethods):
+    """
+    A lazy version of Wrap.  
+
+    The tabular operators are not executed immediately, instead they are collected into a plan, a Pipe of tabular operators
+    starting with the source table.  The plan is optimized and executed when the result is needed by collect(), .df, 
+    or any of the methods which need the data, e.g. render()
+
+    w.lazy().extend(C="A * 2").where("B > 1").project("A", "C").take(10).collect()
+    """
+    def __init__(self, source, tabular_operators=None):
+        # source is an instance of Wrap
+        self.source = source
+        self.tabular_operators = list(tabular_operators or [])
+
+    def _evaluate_tabular_operator(self, tabular_operator):
+        return LazyWrap(self.source, self.tabular_operators + [tabular_operator])
+
+    def get_plan(self):
+        return ops.Pipe([ops.Table(self.source)] + self.tabular_operators)
+
+    def get_optimized_plan(self):
+        return optimizer.optimize(self.get_plan())
+
+    def explain(self, optimized=True):
+        """
+        return the plan as a string
+        """
+        if optimized:
+            return str(self.get_optimized_plan())
+        return str(self.get_plan())
 
-    def getschema(self):
-        expr = "getschema"
-        return self._execute_tabular_operator(expr)
+    def __str__(self):
+        return self.explain(optimized=False)
+
+    def collect(self):
+        """
+        execute the plan and return the result as a Wrap
+        """
+        # the Table at the start of the plan brings in the let statements of the source
+        return self.get_optimized_plan().evaluate_query(Wrap(pd.DataFrame()))
+
+    @property
+    def df(self):
+        return self.collect().df
+
+    def lazy(self):
+        return self
+
+    def execute(self, expression):
+        """
+        add a Kusto query to the plan.  Use `self` to refer to the table so far.  See Wrap.execute
+        """
+        parsed = expression_parser.parse_expression_query(expression)
+
+        statements = parsed.query_statements
+        if len(statements) == 1 and isinstance(statements[0], ops.Pipe):
+            first, *rest = statements[0].tabular_operators
+            refers_to_self = [n for n in optimizer.iter_nodes(rest) if isinstance(n, ops.TableIdentifier) and str(n.identifier) == TABLE_SELF]
+            if isinstance(first, ops.TableIdentifier) and str(first.identifier) == TABLE_SELF and not refers_to_self:
+                # the common case.  self | where ... | extend ...
+                # add the operators to the plan so that they can be optimized together with the rest of it
+                return LazyWrap(self.source, self.tabular_operators + rest)
+
+        return self._evaluate_tabular_operator(ops.SubQuery(parsed))
+
+    def let(self, **kwargs):
+        return self._evaluate_tabular_operator(ops.LetValues(kwargs))
+
+    def join(self, right, on=None, left_on=None, right_on=None, kind="inner"):
+        kwargs = dict(on=on, left_on=left_on, right_on=right_on, kind=kind)
+        return self._evaluate_tabular_operator(ops.Join(_as_plan(right), kwargs))
+
+    def union(self, tables, kind="outer"):
+        return self._evaluate_tabular_operator(ops.Union([_as_plan(t) for t in tables], dict(kind=kind)))
+
+    def render(self, visualization=None, **kwargs):
+        return self.collect().render(visualization=visualization, **kwargs)
+
+    def to_clipboard(self, name=None):
+        self.collect().to_clipboard(name=name)
+        return self
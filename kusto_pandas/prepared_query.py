@@ -0,0 +1,57 @@
+import pandas as pd
+
+from . import expression_parser
+from .expression_parser.expression_parser_types import QueryParameter
+from .expression_parser.optimizer import iter_nodes
+from .kusto_pandas import Wrap
+
+def _find_query_parameters(parsed):
+    return set(n.value for n in iter_nodes(parsed) if isinstance(n, QueryParameter))
+
+class PreparedQuery:
+    """
+    A query which is parsed once and can be run many times with different values for its parameters.
+
+    Parameters are written @name in the query and are bound by keyword when the query is run
+
+    q = prepare("T | where A > @threshold | take @n")
+    q.run({"T": df}, threshold=5, n=10)
+
+    Lists can be bound too, e.g. "T | where A in @ids"
+    """
+    def __init__(self, query):
+        self.query = query
+        self.parsed = expression_parser.parse_expression_query(query)
+        self.parameters = frozenset(_find_query_parameters(self.parsed))
+
+    def __str__(self):
+        return self.query
+
+    def _validate_params(self, params):
+        missing = self.parameters - set(params)
+        if missing:
+            raise KeyError("No value was passed for query parameters: " + ", ".join(sorted(missing)))
+        unknown = set(params) - self.parameters
+        if unknown:
+            raise KeyError("The query does not have parameters: " + ", ".join(sorted(unknown)))
+
+    def run(self, tables=None, **params):
+        """
+        Run the query.
+
+        tables is a dictionary of table name to DataFrame or Wrap.  The remaining keyword arguments are the query parameters
+        """
+        self._validate_params(params)
+
+        w = Wrap(pd.DataFrame())
+        if tables:
+            w = w.let(**tables)
+        bound = dict((QueryParameter.prefix + name, value) for name, value in params.items())
+        w = w.let(**bound)
+        return self.parsed.evaluate_query(w)
+
+def prepare(query):
+    """
+    Parse a query once so that it can be run many times with different parameters.  See PreparedQuery
+    """
+    return PreparedQuery(query)
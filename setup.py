@@ -31,6 +31,6 @@ setup(name='kusto_pandas',
       packages=find_packages(),
       install_requires=required_list,
       package_data = {
-        '': ['*.peg' ],
+        '': ['*.peg', '*.pickle' ],
       }
      )
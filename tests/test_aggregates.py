@@ -996,4 +996,110 @@ def test_summarize_make_bag_noby():
     print(wnew)
 
     assert ["make_bag_A"] == list(wnew.df.columns)
-    assert dict(k=1, k2=2, k3=3, k4=4) == wnew.df["make_bag_A"][0]
\ No newline at end of file
+    assert dict(k=1, k2=2, k3=3, k4=4) == wnew.df["make_bag_A"][0]
+
+def test_summarize_many_aggregates_together():
+    df = create_df()
+    df["E"] = [True, False, True, True, None]
+
+    w = Wrap(df)
+    wnew = w.summarize("count(), sum(A), sum(B), avg(A), x = max(B) - min(B), min(C), max(D), countif(A > 1), dcount(E), sum(B * 2), avg(E)", "G")
+
+    assert ["G", "count_", "sum_A", "sum_B", "avg_A", "x", "min_C", "max_D", "countif_", "dcount_E", "sum_", "avg_E"] == list(wnew.df.columns)
+    assert [3, 2] == list(wnew.df["count_"])
+    assert [4.0, 6.0] == list(wnew.df["sum_A"])
+    assert [4, 6] == list(wnew.df["sum_B"])
+    assert [4.0 / 3, 3.0] == list(wnew.df["avg_A"])
+    assert [3, 2] == list(wnew.df["x"])
+    assert ["foo1", "foo3"] == list(wnew.df["min_C"])
+    assert list(pd.to_datetime(["2009-01-06", "2009-01-07"])) == list(wnew.df["max_D"])
+    assert [1, 2] == list(wnew.df["countif_"])
+    assert [2, 1] == list(wnew.df["dcount_E"])
+    assert [8, 12] == list(wnew.df["sum_"])
+
+def test_summarize_if_aggregates_empty_groups():
+    df = pd.DataFrame()
+    df["G"] = ["G1", "G1", "G2", None, "G3", "G3"]
+    df["B"] = [1, 2, 3, 4, 5, 6]
+    df["S"] = ["a", "b", "c", "d", "e", "f"]
+    df["C"] = [True, False, False, True, True, True]
+
+    w = Wrap(df)
+    wnew = w.summarize("sumif(B, C), minif(S, C), dcountif(S, C), anyif(S, C), make_list_if(B, C)", "G")
+
+    assert ["G1", "G2", "G3"] == list(wnew.df["G"])
+    assert [1.0, 11.0] == list(wnew.df["sumif_B_C"].iloc[[0, 2]])
+    assert np.isnan(wnew.df["sumif_B_C"].iloc[1])
+    assert ["a", "e"] == list(wnew.df["minif_S_C"].iloc[[0, 2]])
+    assert pd.isna(wnew.df["minif_S_C"].iloc[1])
+    assert [1.0, 2.0] == list(wnew.df["dcountif_S_C"].iloc[[0, 2]])
+    assert ["a", "e"] == list(wnew.df["anyif_S_C"].iloc[[0, 2]])
+    assert pd.isna(wnew.df["anyif_S_C"].iloc[1])
+    assert [[1], None, [5, 6]] == list(wnew.df["make_list_if_B_C"])
+
+def test_summarize_arg_max_star():
+    df = create_df()
+    df["F"] = [1, 0, 9, 4, 8]
+
+    w = Wrap(df)
+    wnew = w.execute("self | summarize arg_max(F, *) by G")
+
+    assert ["G", "F", "A", "B", "C", "D"] == list(wnew.df.columns)
+    assert ["G1", "G2"] == list(wnew.df["G"])
+    assert [4, 9] == list(wnew.df["F"])
+    assert ["foo4", "foo3"] == list(wnew.df["C"])
+    assert list(pd.to_datetime(["2009-01-06", "2009-01-05"])) == list(wnew.df["D"])
+
+def test_summarize_arg_min_columns():
+    df = create_df()
+    df["F"] = [1, 0, 9, 0, np.nan]
+    df["G"] = ["G1", "G1", "G2", "G1", "G3"]
+
+    w = Wrap(df)
+    wnew = w.summarize("arg_min(F, C, B + 1), count()", "G")
+
+    assert ["G", "F", "C", "Column1", "count_"] == list(wnew.df.columns)
+    # the first row wins a tie.  A group where F is always null has no row
+    assert ["foo2", "foo3"] == list(wnew.df["C"].iloc[:2])
+    assert pd.isna(wnew.df["C"].iloc[2])
+    assert [2, 3] == list(wnew.df["Column1"].iloc[:2])
+    assert np.isnan(wnew.df["F"].iloc[2])
+    assert [3, 1, 1] == list(wnew.df["count_"])
+
+def test_summarize_arg_max_noby():
+    df = create_df()
+    df["F"] = [8, 1, 2, 3, 8]
+
+    w = Wrap(df)
+    wnew = w.summarize("arg_max(F, B, C)")
+
+    assert ["F", "B", "C"] == list(wnew.df.columns)
+    assert [[8, 0, "foo1"]] == wnew.df.values.tolist()
+
+def test_summarize_make_max_size():
+    df = pd.DataFrame()
+    df["G"] = [1, 1, 1, 2, 2, 1]
+    df["A"] = [4, 4, 5, 6, 7, 9]
+    df["B"] = [True, True, True, False, True, True]
+    df["D"] = [dict(a=1), dict(b=2), dict(a=3, c=4), dict(x=1), "hi", dict(d=5)]
+
+    w = Wrap(df)
+    wnew = w.summarize("make_list(A, 2), make_set(A, 2), make_bag(D, 2), make_list_if(A, B, 1)", "G")
+
+    assert ["G", "make_list_A", "make_set_A", "make_bag_D", "make_list_if_A_B"] == list(wnew.df.columns)
+    assert [[4, 4], [6, 7]] == list(wnew.df["make_list_A"])
+    # the first 2 distinct values
+    assert [{4, 5}, {6, 7}] == list(wnew.df["make_set_A"])
+    assert [dict(a=3, b=2), dict(x=1)] == list(wnew.df["make_bag_D"])
+    assert [[4], [7]] == list(wnew.df["make_list_if_A_B"])
+
+def test_summarize_make_no_rows():
+    df = pd.DataFrame()
+    df["A"] = [4, 5]
+
+    w = Wrap(df).where("A > 10")
+    wnew = w.summarize("make_list(A), make_set(A), make_bag(A)")
+
+    assert [[]] == list(wnew.df["make_list_A"])
+    assert [set()] == list(wnew.df["make_set_A"])
+    assert [dict()] == list(wnew.df["make_bag_A"])
@@ -5,7 +5,6 @@ from context import expression_parser as ep
 
 from kusto_pandas.expression_parser import parse_expression
 from kusto_pandas.methods import method_map
-from kusto_pandas.kusto_pandas import MultiDict
 
 class TestBetweenOperator(unittest.TestCase):
     def test_between(self):
@@ -54,12 +53,12 @@ class TestBetweenOperator(unittest.TestCase):
         x = 'A between (datetime("2020-01-01") .. datetime("2020-02-01"))'
         parsed = parse_expression(x)
         self.assertEqual(str(parsed), '(A between (datetime(2020-01-01) .. datetime(2020-02-01)))')
-        vars = MultiDict([method_map, {
-            "A": pd.Series([
+        vars = dict(method_map)
+        vars["A"] = pd.Series([
                 pd.to_datetime("2019-01-10"),
                 pd.to_datetime("2020-01-10"),
                 pd.to_datetime("2020-02-10")
-                ])}])
+                ])
         result = parsed.evaluate(vars)
         self.assertListEqual(list(result), [False, True, False])
     
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+from parsimonious.grammar import Grammar
+
+from context import Wrap
+
+from kusto_pandas.expression_parser import compiled_grammar as cg
+
+def test_compiled_grammar_is_up_to_date():
+    # if this fails, regenerate it with python -m kusto_pandas.expression_parser.compiled_grammar
+    grammar = cg._load_compiled_grammar(cg.read_grammar_text())
+    assert isinstance(grammar, Grammar)
+
+def test_compiled_grammar_matches_peg():
+    grammar = cg._load_compiled_grammar(cg.read_grammar_text())
+    compiled = cg.compile_grammar(cg.read_grammar_text())
+    assert set(grammar.keys()) == set(compiled.keys())
+    for rule in compiled.keys():
+        assert compiled[rule].as_rule() == grammar[rule].as_rule()
+
+def test_stale_compiled_grammar_is_ignored():
+    assert cg._load_compiled_grammar(cg.read_grammar_text() + "\n# changed") is None
+
+def test_write_compiled_grammar(tmp_path):
+    path = os.path.join(str(tmp_path), "grammar.pickle")
+    cg.write_compiled_grammar(path)
+    assert os.path.getsize(path) > 0
+
+def test_import_is_lazy():
+    code = "\n".join([
+        "import sys",
+        "import kusto_pandas",
+        "from kusto_pandas import Wrap",
+        "lazy = ['parsimonious', 'kusto_pandas.expression_parser.parsimonious_parser', 'kusto_pandas._render', 'kusto_pandas.magic']",
+        "print(','.join(m for m in lazy if m in sys.modules))",
+        ])
+    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=repo_root)
+    assert "" == output.decode().strip()
@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from context import Wrap
+
+from kusto_pandas.expression_parser import parse_expression
+from kusto_pandas.expression_parser.compiler import compile_expression, expression_key, set_numexpr_enabled
+
+def create_df():
+    df = pd.DataFrame(index=range(4))
+    df["A"] = [0.0, 1.0, 2.0, 3.0]
+    df["B"] = [3, 2, 1, 0]
+    df["S"] = ["ab", "Bc", "cd", None]
+    df["D"] = [{"k": 1}, {"k": 2}, {}, None]
+    return df
+
+@pytest.mark.parametrize("expression", [
+    "A * 2 + B / (A + 1) - -A",
+    "A > 1 and B < 2 or A == 0",
+    "S contains \"b\" or S startswith \"c\"",
+    "B in (1, 2) and S !in~ (\"AB\")",
+    "A between (1 .. 2)",
+    "A !between (1 .. 2)",
+    "D.k",
+    "D[\"k\"]",
+    "y = A % 2",
+    ])
+def test_compiled_matches_evaluate(expression):
+    parsed = parse_expression(expression, debug=False)
+    df = create_df()
+    expected = parsed.evaluate(df)
+    result = compile_expression(parsed)(df)
+
+    if isinstance(expected, dict):
+        expected, result = expected["y"], result["y"]
+    pd.testing.assert_series_equal(expected, result)
+
+def test_compiled_matches_evaluate_scalars():
+    parsed = parse_expression("1 + 3 == 8 / 2 and \"Abc\" contains \"b\"", debug=False)
+    assert parsed.evaluate(None) == compile_expression(parsed)(None)
+
+def test_compiled_expression_is_cached():
+    parsed = parse_expression("A + B * 2", debug=False)
+    assert compile_expression(parsed) is compile_expression(parsed)
+
+def test_compiled_methods_and_lets():
+    w = Wrap(create_df())
+    w = w.let(c=10, f=lambda x: x * 2)
+    result = w.execute("self | extend C = f(A) + c + strlen(S) | where C > 12")
+    assert [14.0, 16.0] == list(result.df["C"])
+
+def create_numeric_df(n=1000):
+    rng = np.random.RandomState(0)
+    df = pd.DataFrame(index=range(n))
+    df["A"] = rng.rand(n)
+    df.loc[::7, "A"] = np.nan
+    df["B"] = rng.randint(0, 10, n)
+    df["C"] = rng.rand(n) + 0.1
+    df["F"] = rng.rand(n) > 0.5
+    df["S"] = rng.choice(["x", "y"], n)
+    return df
+
+@pytest.fixture
+def numexpr_disabled():
+    set_numexpr_enabled(False)
+    yield
+    set_numexpr_enabled(True)
+
+@pytest.mark.parametrize("expression", [
+    "(A * 2 + B) / C > 0.5 and B < 5",
+    "-A * 3 - B / B",
+    "B < 3 or F and A > 0.2",
+    "B * 2 + B",
+    # numexpr can't do these, so they fall back to pandas
+    "(F + F) * 2",
+    "(A + B) * 2 == S",
+    ])
+def test_numexpr_matches_pandas(expression, numexpr_disabled):
+    pytest.importorskip("numexpr")
+    parsed = parse_expression(expression, debug=False)
+    df = create_numeric_df()
+    expected = compile_expression(parsed)(df)
+
+    set_numexpr_enabled(True)
+    result = compile_expression(parsed)(df)
+    pd.testing.assert_series_equal(expected, result, check_names=False)
+
+def test_numexpr_different_index_is_aligned():
+    w = Wrap(create_numeric_df(4))
+    w = w.let(x=pd.Series([1.0, 2.0, 3.0, 4.0], index=[3, 2, 1, 0]))
+    result = w.execute("self | extend y = B * 0 + x * 2 + 1")
+    assert [9.0, 7.0, 5.0, 3.0] == list(result.df["y"])
+
+class CountingMethod:
+    def __init__(self):
+        self.calls = 0
+    def __call__(self, x):
+        self.calls += 1
+        return x * 2
+
+def test_shared_subexpressions_are_evaluated_once():
+    f = CountingMethod()
+    w = Wrap(create_df()).let(f=f)
+
+    result = w.extend("x = f(A) + 1", "y = f(A) * B", "z = f(B)")
+    assert 2 == f.calls
+    assert [1.0, 3.0, 5.0, 7.0] == list(result.df["x"])
+    assert [0.0, 4.0, 4.0, 0.0] == list(result.df["y"])
+
+    f.calls = 0
+    result = w.where("f(A) > 1 and f(A) < 5")
+    assert 1 == f.calls
+    assert [1.0, 2.0] == list(result.df["A"])
+
+    f.calls = 0
+    result = w.summarize("avg(f(A)), m = max(f(A)) + min(f(A))", "B")
+    assert 1 == f.calls
+    assert [12.0, 8.0, 4.0, 0.0] == list(result.df["m"])
+
+def test_expression_key():
+    parsed = parse_expression("(A / B) + ['(A / B)'] + (A / B)", debug=False)
+    keys = dict()
+    expression_key(parsed, keys)
+    left = parsed.left
+    assert keys[id(left.left)] != keys[id(left.right)]
+    assert keys[id(left.left)] == keys[id(parsed.right)]
+
+def test_constant_subexpressions_are_folded():
+    parsed = parse_expression("T + 1d * 7", debug=False)
+    assert pd.Timedelta(days=7) == compile_expression(parsed.right).constant_value
+
+    ts = pd.Series(pd.to_datetime(["2020-01-01", "2020-02-01"]))
+    result = compile_expression(parsed)({"T": ts})
+    assert list(ts + pd.Timedelta(days=7)) == list(result)
+
+    parsed = parse_expression("B in (1, 2 * 3, \"a\")", debug=False)
+    assert [1, 6, "a"] == compile_expression(parsed.right).constant_value
+
+def test_constant_errors_are_raised_when_evaluated():
+    parsed = parse_expression("A + 1 / 0", debug=False)
+    compiled = compile_expression(parsed)
+    with pytest.raises(ZeroDivisionError):
+        compiled({"A": 1})
+
+@pytest.mark.parametrize("expression", [
+    "S in (\"ab\", \"cd\", \"x\")",
+    "S !in (\"ab\", \"cd\", \"x\")",
+    "S in~ (\"AB\", \"bc\")",
+    "S !in~ (\"AB\", \"bc\")",
+    "A in (1, 3, 3, 7)",
+    "B in (1.0, 2.5)",
+    "B !in (1, \"a\")",
+    "D in (1, 2)",
+    ])
+def test_in_constant_list(expression):
+    parsed = parse_expression(expression, debug=False)
+    df = create_df()
+    pd.testing.assert_series_equal(parsed.evaluate(df), compile_expression(parsed)(df))
+    assert parsed.evaluate(df.iloc[1]) == compile_expression(parsed)(df.iloc[1])
@@ -0,0 +1,345 @@
+import unittest
+import pandas as pd
+import numpy as np
+
+from context import Wrap
+
+from kusto_pandas import LazyWrap
+
+def create_df():
+    df = pd.DataFrame(index=range(5))
+    df["A"] = [0.0, 1.0, 2.0, 3.0, 4.0]
+    df["B"] = [0, 1, 2, 3, 4]
+    df["C"] = ["foo1", "foo2", "foo3", "foo4", "foo5"]
+    df["G"] = ["G1", "G1", "G2", "G1", "G2"]
+    return df
+
+class TestLazyWrap(unittest.TestCase):
+    def test_lazy_matches_eager(self):
+        w = Wrap(create_df())
+        eager = w.extend(Z="B * 2").where("Z > 2").project("A", "Z").sort("Z asc").take(2)
+        lazy = w.lazy().extend(Z="B * 2").where("Z > 2").project("A", "Z").sort("Z asc").take(2)
+
+        self.assertIsInstance(lazy, LazyWrap)
+        pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+    def test_lazy_is_deferred(self):
+        calls = []
+        def double(x):
+            calls.append(1)
+            return x * 2
+
+        w = Wrap(create_df()).let(double=double)
+        lazy = w.lazy().extend(Z="double(B)").where("Z > 2")
+        self.assertEqual(0, len(calls))
+
+        wnew = lazy.collect()
+        self.assertEqual(1, len(calls))
+        self.assertIsInstance(wnew, Wrap)
+        self.assertListEqual([4, 6, 8], list(wnew.df["Z"]))
+
+    def test_lazy_is_immutable(self):
+        lazy = Wrap(create_df()).lazy()
+        lazy2 = lazy.where("B > 2")
+        self.assertEqual(5, len(lazy.df))
+        self.assertEqual(2, len(lazy2.df))
+
+    def test_lazy_explain(self):
+        lazy = Wrap(create_df()).lazy().where("B > 2").take(1)
+        plan = lazy.explain(optimized=False)
+        self.assertIn("where (B > 2)", plan)
+        self.assertIn("take 1", plan)
+
+    def test_lazy_summarize(self):
+        w = Wrap(create_df())
+        eager = w.summarize("x = sum(B), count() by G")
+        lazy = w.lazy().summarize("x = sum(B), count() by G")
+        pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+    def test_lazy_execute(self):
+        w = Wrap(create_df())
+        lazy = w.lazy().where("B > 0").execute("self | extend Z = B + 1 | take 2")
+        # the operators of the query become part of the plan
+        self.assertEqual(3, len(lazy.tabular_operators))
+        self.assertListEqual([2, 3], list(lazy.df["Z"]))
+
+    def test_lazy_execute_full_query(self):
+        w = Wrap(create_df())
+        lazy = w.lazy().where("B > 0").execute("let x = 3; self | where B < x")
+        self.assertListEqual([1, 2], list(lazy.df["B"]))
+
+    def test_lazy_let(self):
+        w = Wrap(create_df())
+        lazy = w.lazy().let(x=2).where("B > x")
+        self.assertListEqual([3, 4], list(lazy.df["B"]))
+
+    def test_lazy_let_elementwise(self):
+        w = Wrap(create_df())
+        lazy = w.lazy().let_elementwise(f=lambda c: c.upper()).extend(U="f(C)")
+        self.assertListEqual(["FOO1", "FOO2", "FOO3", "FOO4", "FOO5"], list(lazy.df["U"]))
+
+    def test_lazy_join(self):
+        df = create_df()
+        right = pd.DataFrame({"G": ["G1", "G2"], "H": [10, 20]})
+        eager = Wrap(df).join(right, on="G")
+        lazy = Wrap(df).lazy().join(Wrap(right).lazy().where("H > 0"), on="G")
+        pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+        lazy = Wrap(df).lazy().join(right, on="G")
+        pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+    def test_lazy_union(self):
+        df = create_df()
+        eager = Wrap(df).union([df])
+        lazy = Wrap(df).lazy().union([Wrap(df).lazy()])
+        pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+    def test_lazy_source_let_statements(self):
+        w = Wrap(create_df()).let(x=3)
+        lazy = w.lazy().where("B >= x")
+        self.assertListEqual([3, 4], list(lazy.df["B"]))
+
+    def test_predicate_pushdown_extend(self):
+        w = Wrap(create_df())
+        lazy = w.lazy().extend(Z="B * 2").where("B > 2").where("Z > 0")
+        plan = lazy.explain()
+        # the first where doesn't use Z, so it runs before the extend.  The second one has to stay after it
+        self.assertLess(plan.index("where (B > 2)"), plan.index("extend"))
+        self.assertLess(plan.index("extend"), plan.index("where (Z > 0)"))
+
+        eager = w.extend(Z="B * 2").where("B > 2").where("Z > 0")
+        pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+    def test_predicate_pushdown_unnamed_extend(self):
+        w = Wrap(create_df())
+        lazy = w.lazy().extend("B * 2").where("Column1 > 4")
+        self.assertTrue(lazy.explain().endswith("| where (Column1 > 4)"))
+
+        eager = w.extend("B * 2").where("Column1 > 4")
+        pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+    def test_predicate_pushdown_project_rename(self):
+        w = Wrap(create_df())
+        lazy = w.lazy().project("A", X="B", Y="B + 1").project_rename(W="X").sort("A desc").where("W > 2")
+        plan = lazy.explain()
+        self.assertTrue(plan.startswith("table(4 columns)[A, B] | where (B > 2)"), plan)
+
+        eager = w.project("A", X="B", Y="B + 1").project_rename(W="X").sort("A desc").where("W > 2")
+        pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+    def test_predicate_pushdown_blocked(self):
+        w = Wrap(create_df())
+        lazy = w.lazy().project("A", Y="B + 1").where("Y > 2")
+        self.assertIn("| where (Y > 2)", lazy.explain())
+
+        # the let method could depend on the other rows, so the extend must run on all of them
+        lazy = w.let(f=lambda x: x - x.mean()).lazy().extend(Z="f(B)").where("B > 2")
+        self.assertTrue(lazy.explain().endswith("| where (B > 2)"))
+        self.assertListEqual([1.0, 2.0], list(lazy.df["Z"]))
+
+        # the column C no longer exists after the rename
+        lazy = w.lazy().project_rename(D="C").where("B > 2").take(1).project("D")
+        self.assertTrue(lazy.explain().startswith("table(4 columns)[B, C] | where"))
+
+    def test_predicate_pushdown_join(self):
+        df = create_df()
+        right = pd.DataFrame({"G": ["G1", "G2"], "B": [10, 20]})
+
+        lazy = Wrap(df).lazy().join(right, on="G").where("B > 1").where("B_y > 10")
+        plan = lazy.explain()
+        self.assertTrue(plan.startswith("table(4 columns) | where (B > 1) | join"), plan)
+        self.assertIn("(table(2 columns) | where (B > 10))", plan)
+
+        eager = Wrap(df).join(right, on="G").where("B > 1").where("B_y > 10")
+        # merge numbers the rows it returns, so filtering first changes the index
+        pd.testing.assert_frame_equal(eager.df.reset_index(drop=True), lazy.df.reset_index(drop=True))
+
+        # the rows of an inner join are in the order of the left rows, whichever rows the where removed first
+        for kind in ["inner", "left"]:
+            lazy = Wrap(df).lazy().join(right, on="G", kind=kind).where("B > 1")
+            self.assertTrue(lazy.explain().startswith("table(4 columns) | where (B > 1) | join"))
+            eager = Wrap(df).join(right, on="G", kind=kind).where("B > 1")
+            self.assertListEqual([2, 3, 4], list(lazy.df["B"]))
+            pd.testing.assert_frame_equal(eager.df.reset_index(drop=True), lazy.df.reset_index(drop=True))
+
+    def test_predicate_pushdown_join_duplicate_keys(self):
+        left = pd.DataFrame({"K": [1, 2, 3, 4, 2, 5], "A": [10, 20, 30, 40, 50, 60]})
+        right = pd.DataFrame({"K": [2, 3, 4, 9, 2], "X": [7, 8, 9, 10, 11]})
+
+        # the matching right rows of each left row are in the order of the right rows too
+        lazy = Wrap(left).lazy().join(right, on="K").where("A > 20")
+        self.assertTrue(lazy.explain().startswith("table(2 columns) | where (A > 20) | join"))
+        self.assertListEqual([30, 40, 50, 50], list(lazy.df["A"]))
+        self.assertListEqual([8, 9, 7, 11], list(lazy.df["X"]))
+
+        eager = Wrap(left).join(right, on="K").where("A > 20")
+        pd.testing.assert_frame_equal(eager.df.reset_index(drop=True), lazy.df.reset_index(drop=True))
+
+    def test_predicate_pushdown_outer_join(self):
+        df = create_df()
+        right = pd.DataFrame({"G": ["G1", "G3"], "H": [10, 20]})
+
+        lazy = Wrap(df).lazy().join(right, on="G", kind="outer").where("H > 1")
+        self.assertTrue(lazy.explain().endswith("| where (H > 1)"))
+
+        eager = Wrap(df).join(right, on="G", kind="outer").where("H > 1")
+        pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+    def test_column_pruning(self):
+        w = Wrap(create_df())
+        lazy = w.lazy().where("B > 1").extend(Z="A * 2").sort("Z desc").project("Z", "C")
+        self.assertTrue(lazy.explain().startswith("table(4 columns)[A, B, C] |"))
+
+        eager = w.where("B > 1").extend(Z="A * 2").sort("Z desc").project("Z", "C")
+        pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+    def test_column_pruning_patterns(self):
+        w = Wrap(create_df())
+        lazy = w.lazy().project_rename(X="A").where("B > 1").project_keep("X", "G*")
+        self.assertTrue(lazy.explain().startswith("table(4 columns)[A, B, X, G*] |"))
+        self.assertListEqual(["X", "G"], list(lazy.df.columns))
+
+        lazy = w.lazy().project_away("C").count()
+        self.assertTrue(lazy.explain().startswith("table(4 columns)[C] |"))
+        self.assertListEqual([5], list(lazy.df["Count"]))
+
+    def test_column_pruning_all_columns(self):
+        w = Wrap(create_df())
+        for lazy in [w.lazy().where("B > 1"), w.lazy().summarize("any(*) by G"), w.lazy().extend("B * 2").project("B")]:
+            self.assertTrue(lazy.explain().startswith("table(4 columns) |"))
+
+    def test_column_pruning_summarize(self):
+        w = Wrap(create_df())
+        lazy = w.lazy().extend(Z="B + 1").summarize("x = sum(Z), count() by G")
+        self.assertTrue(lazy.explain().startswith("table(4 columns)[B, G] |"))
+
+        eager = w.extend(Z="B + 1").summarize("x = sum(Z), count() by G")
+        pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+    def test_fuse_where(self):
+        w = Wrap(create_df())
+        lazy = w.lazy().where("B > 0").where("C != 'foo3'").where("G == 'G1'")
+        self.assertEqual(2, len(lazy.get_optimized_plan().tabular_operators))
+        self.assertIn("where (B > 0) | where (C != \"foo3\") | where (G == \"G1\")", lazy.explain())
+
+        eager = w.where("B > 0").where("C != 'foo3'").where("G == 'G1'")
+        pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+    def test_fuse_where_evaluates_on_remaining_rows(self):
+        lengths = []
+        def above_mean(x):
+            lengths.append(len(x))
+            return x > x.mean()
+
+        w = Wrap(create_df()).let(above_mean=above_mean, t=True)
+        lazy = w.lazy().where("B > 0").where("above_mean(A)").where("t")
+        self.assertListEqual([3, 4], list(lazy.df["B"]))
+        self.assertListEqual([4], lengths)
+
+    def test_sort_take_to_top(self):
+        w = Wrap(create_df())
+        lazy = w.lazy().sort("G asc, B desc").take(3)
+        self.assertTrue(lazy.explain().endswith("| top 3 by (G asc), (B desc)"))
+
+        eager = w.sort("G asc, B desc").take(3)
+        pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+    def test_limit_pushdown(self):
+        w = Wrap(create_df())
+        lazy = w.lazy().extend(Z="B * 2").project_rename(Y="Z").project_away("C").take(2)
+        self.assertTrue(lazy.explain().startswith("table(4 columns) | take 2 | extend"))
+
+        eager = w.extend(Z="B * 2").project_rename(Y="Z").project_away("C").take(2)
+        pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+        # the let method could depend on the other rows
+        lazy = w.let(f=lambda x: x - x.mean()).lazy().extend(Z="f(B)").take(2)
+        self.assertTrue(lazy.explain().endswith("| take 2"))
+        self.assertListEqual([-2.0, -1.0], list(lazy.df["Z"]))
+
+    def test_where_take_stops_early(self):
+        df = pd.DataFrame({"X": [1] * 5000 + ["x"] * 5000})
+        df["X"] = df["X"].astype(object)
+        w = Wrap(df)
+        with self.assertRaises(TypeError):
+            w.where("X > 0").take(10)
+
+        # the rows with strings are never compared
+        lazy = w.lazy().where("X > 0").extend(Y="X + 1").take(10)
+        self.assertIn("where (X > 0) | take 10 | extend", lazy.explain())
+        self.assertListEqual([2] * 10, list(lazy.df["Y"]))
+
+    def test_where_take(self):
+        df = pd.DataFrame({"X": np.arange(10000)})
+        w = Wrap(df)
+        for n in [0, 3, 2000, 9999, 20000]:
+            lazy = w.lazy().where("X % 3 == 1").where("X > 100").take(n)
+            eager = w.where("X % 3 == 1").where("X > 100").take(n)
+            pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+    def test_reuse_extended_columns(self):
+        calls = []
+        def double(x):
+            calls.append(1)
+            return x * 2
+        w = Wrap(create_df()).let(double=double)
+
+        for lazy in [
+                w.lazy().extend(Z="double(B) + 1").where("double(B) + 1 > 4"),
+                w.lazy().extend(Z="double(B) + 1").extend(Y="(double(B) + 1) * A", B="A")]:
+            self.assertIn("Z", lazy.explain().split("| ")[-1])
+            calls.clear()
+            lazy.collect()
+            self.assertEqual(1, len(calls))
+
+        lazy = w.lazy().extend(Z="B % 3").where("B % 3 > 0").where("strlen(C) == 4").extend(Y="(B % 3) * A", B="A")
+        plan = lazy.explain()
+        self.assertIn("where (Z > 0)", plan)
+        self.assertIn("(Y = (Z * A))", plan)
+
+        eager = w.extend(Z="B % 3").where("B % 3 > 0").where("strlen(C) == 4").extend(Y="(B % 3) * A", B="A")
+        pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+    def test_reuse_extended_columns_blocked(self):
+        w = Wrap(create_df())
+        # A is changed by the extend, so A + 1 is not Z after it
+        lazy = w.lazy().extend(Z="A + 1", A="B * 10").where("A + 1 > 20")
+        self.assertIn("where ((A + 1) > 20)", lazy.explain())
+        self.assertListEqual([20, 30, 40], list(lazy.df["A"]))
+
+        # the let method could depend on the other rows, so it is only reused directly after the extend
+        lazy = w.let(f=lambda x: x - x.mean()).lazy().extend(Z="f(B)").where("f(B) > -2").where("f(B) > 0")
+        plan = lazy.explain()
+        self.assertIn("where (Z > (-2))", plan)
+        self.assertIn("where (f(B) > 0)", plan)
+
+    def test_let_series_is_not_row_wise(self):
+        df = create_df()
+        w = Wrap(df).let(s=df["B"] * 2)
+
+        # s is lined up with the whole table, so it can't be read one chunk at a time
+        for query in ["A > s", "A + s > 10"]:
+            lazy = w.lazy().where(query).take(3)
+            eager = w.where(query).take(3)
+            pd.testing.assert_frame_equal(eager.df, lazy.df)
+
+        lazy = w.lazy().extend(Z="A + s").take(2)
+        self.assertTrue(lazy.explain().endswith("| take 2"))
+        pd.testing.assert_frame_equal(w.extend(Z="A + s").take(2).df, lazy.df)
+
+        lazy = w.lazy().extend(Z="B + s").where("B > 1")
+        self.assertTrue(lazy.explain().endswith("| where (B > 1)"))
+        pd.testing.assert_frame_equal(w.extend(Z="B + s").where("B > 1").df, lazy.df)
+
+    def test_let_series_mask_aligns_by_index(self):
+        df = create_df()
+        # the mask is lined up with the rows by its index, not by position, as extend does
+        s = pd.Series([False, True, False, False, False], index=[4, 3, 2, 1, 0])
+        w = Wrap(df).let(s=s)
+        self.assertListEqual([3], list(w.where("s").df["B"]))
+        self.assertListEqual([False, False, False, True, False], list(w.extend(Z="s").df["Z"]))
+        self.assertListEqual([], list(w.where("B < 3").where("s").df["B"]))
+        self.assertListEqual([3], list(w.where("B > 1").where("s").df["B"]))
+
+        for lazy in [w.lazy().where("s"), w.lazy().where("s").take(3), w.lazy().where("B > 0").where("s").take(1)]:
+            self.assertListEqual([3], list(lazy.df["B"]))
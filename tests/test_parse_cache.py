@@ -0,0 +1,120 @@
+import pandas as pd
+import pytest
+
+from context import Wrap
+
+from kusto_pandas.expression_parser.parse_cache import ParseCache, DEFAULT_PARSE_CACHE_SIZE
+from kusto_pandas.expression_parser.parsimonious_parser import parse_expression_query, get_parse_cache, clear_parse_cache, set_parse_cache_size
+
+def create_df():
+    df = pd.DataFrame(index=range(5))
+    df["A"] = [0.0, 1.0, 2.0, 3.0, 4.0]
+    df["B"] = [0, 1, 2, 3, 4]
+    return df
+
+class Counter:
+    def __init__(self):
+        self.count = 0
+    def __call__(self):
+        self.count += 1
+        return self.count
+
+def test_parse_cache_hit_miss():
+    cache = ParseCache(maxsize=2)
+    parse = Counter()
+    assert 1 == cache.get_or_parse("A", "root", parse)
+    assert 1 == cache.get_or_parse("A", "root", parse)
+    info = cache.info()
+    assert 1 == info.hits
+    assert 1 == info.misses
+    assert 0 == info.evictions
+    assert 1 == info.currsize
+
+def test_parse_cache_key_includes_root():
+    cache = ParseCache(maxsize=2)
+    parse = Counter()
+    assert 1 == cache.get_or_parse("A", "root1", parse)
+    assert 2 == cache.get_or_parse("A", "root2", parse)
+
+def test_parse_cache_eviction_lru():
+    cache = ParseCache(maxsize=2)
+    parse = Counter()
+    cache.get_or_parse("A", "root", parse)
+    cache.get_or_parse("B", "root", parse)
+    # touch A so that B is the least recently used
+    cache.get_or_parse("A", "root", parse)
+    cache.get_or_parse("C", "root", parse)
+
+    info = cache.info()
+    assert 1 == info.evictions
+    assert 2 == info.currsize
+    # A is still cached, B is not
+    assert 1 == cache.get_or_parse("A", "root", parse)
+    assert 4 == cache.get_or_parse("B", "root", parse)
+
+def test_parse_cache_resize():
+    cache = ParseCache(maxsize=3)
+    parse = Counter()
+    for text in ["A", "B", "C"]:
+        cache.get_or_parse(text, "root", parse)
+    cache.resize(1)
+    info = cache.info()
+    assert 2 == info.evictions
+    assert 1 == info.currsize
+    assert 1 == info.maxsize
+
+def test_parse_cache_disabled():
+    cache = ParseCache(maxsize=0)
+    parse = Counter()
+    assert 1 == cache.get_or_parse("A", "root", parse)
+    assert 2 == cache.get_or_parse("A", "root", parse)
+    assert 0 == len(cache)
+
+def test_parse_cache_errors_not_cached():
+    cache = ParseCache()
+    def fail():
+        raise ValueError("bad query")
+    with pytest.raises(ValueError):
+        cache.get_or_parse("A", "root", fail)
+    assert 0 == len(cache)
+
+def test_parse_cache_invalid_size():
+    with pytest.raises(ValueError):
+        ParseCache(maxsize=-1)
+
+def test_parse_cache_clear():
+    cache = ParseCache()
+    cache.get_or_parse("A", "root", Counter())
+    cache.clear()
+    info = cache.info()
+    assert 0 == info.currsize
+    assert 0 == info.misses
+
+def test_parse_expression_query_cached():
+    clear_parse_cache()
+    q1 = parse_expression_query("T | where A > 1")
+    q2 = parse_expression_query("T | where A > 1")
+    assert q1 is q2
+    info = get_parse_cache().info()
+    assert 1 == info.hits
+    assert 1 == info.misses
+
+def test_set_parse_cache_size():
+    clear_parse_cache()
+    set_parse_cache_size(1)
+    try:
+        parse_expression_query("T | take 1")
+        parse_expression_query("T | take 2")
+        assert 1 == get_parse_cache().info().evictions
+    finally:
+        set_parse_cache_size(DEFAULT_PARSE_CACHE_SIZE)
+        clear_parse_cache()
+
+def test_cached_query_executes_repeatedly():
+    clear_parse_cache()
+    w = Wrap(create_df())
+    for _ in range(3):
+        wnew = w.execute("self | where A > 1 | summarize x = sum(B), y = count()")
+        assert [9] == list(wnew.df["x"])
+        assert [3] == list(wnew.df["y"])
+    assert get_parse_cache().info().hits >= 2
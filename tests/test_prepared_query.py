@@ -0,0 +1,83 @@
+import unittest
+import pandas as pd
+import pytest
+
+from context import Wrap
+
+import kusto_pandas
+from kusto_pandas import prepare
+
+def create_df():
+    df = pd.DataFrame(index=range(5))
+    df["A"] = [0.0, 1.0, 2.0, 3.0, 4.0]
+    df["B"] = [0, 1, 2, 3, 4]
+    df["C"] = ["foo1", "foo2", "foo3", "foo4", "foo5"]
+    df["G"] = ["G1", "G1", "G2", "G1", "G2"]
+    return df
+
+class TestPreparedQuery(unittest.TestCase):
+    def test_prepare(self):
+        q = prepare("T | where A > @threshold | take @n")
+        self.assertSetEqual({"threshold", "n"}, set(q.parameters))
+
+        w = q.run({"T": create_df()}, threshold=1, n=2)
+        self.assertListEqual([2.0, 3.0], list(w.df["A"]))
+
+        w = q.run({"T": create_df()}, threshold=2, n=10)
+        self.assertListEqual([3.0, 4.0], list(w.df["A"]))
+
+    def test_prepare_wrap_table(self):
+        q = prepare("T | where A > @threshold")
+        w = q.run({"T": Wrap(create_df())}, threshold=3)
+        self.assertListEqual([4.0], list(w.df["A"]))
+
+    def test_prepare_list_parameter(self):
+        q = prepare("T | where C in @ids | project B")
+        w = q.run({"T": create_df()}, ids=["foo2", "foo4"])
+        self.assertListEqual([1, 3], list(w.df["B"]))
+
+    def test_prepare_string_parameter(self):
+        q = prepare("T | where G == @g | summarize x = sum(B)")
+        w = q.run({"T": create_df()}, g="G2")
+        self.assertListEqual([6], list(w.df["x"]))
+
+    def test_prepare_top(self):
+        q = prepare("T | top @n by B")
+        w = q.run({"T": create_df()}, n=2)
+        self.assertListEqual([4, 3], list(w.df["B"]))
+
+    def test_prepare_parameter_in_expression(self):
+        q = prepare("T | extend Z = B * @scale + @offset | project Z")
+        w = q.run({"T": create_df()}, scale=2, offset=1)
+        self.assertListEqual([1, 3, 5, 7, 9], list(w.df["Z"]))
+
+    def test_prepare_parameter_does_not_collide_with_column(self):
+        q = prepare("T | where B > @B")
+        w = q.run({"T": create_df()}, B=3)
+        self.assertListEqual([4], list(w.df["B"]))
+
+    def test_prepare_parameter_in_let(self):
+        q = prepare("let x = @v * 2; T | where B == x")
+        w = q.run({"T": create_df()}, v=2)
+        self.assertListEqual([4], list(w.df["B"]))
+
+    def test_prepare_missing_parameter(self):
+        q = prepare("T | where A > @threshold | take @n")
+        with pytest.raises(KeyError):
+            q.run({"T": create_df()}, threshold=1)
+
+    def test_prepare_unknown_parameter(self):
+        q = prepare("T | where A > @threshold")
+        with pytest.raises(KeyError):
+            q.run({"T": create_df()}, threshold=1, n=2)
+
+    def test_prepare_does_not_reparse(self):
+        q = prepare("T | where A > @threshold")
+        parsed = q.parsed
+        q.run({"T": create_df()}, threshold=1)
+        self.assertIs(parsed, q.parsed)
+
+    def test_parameter_not_bound_in_execute(self):
+        w = Wrap(create_df())
+        with pytest.raises(KeyError):
+            w.execute("self | where A > @threshold")
@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import numpy as np
+
+from context import Wrap
+
+from kusto_pandas.expression_parser.parsimonious_parser import parse_expression_query
+
+def create_df(n=1000):
+    rng = np.random.RandomState(0)
+    df = pd.DataFrame(index=range(n))
+    df["A"] = rng.rand(n)
+    df["B"] = rng.randint(0, 100, n)
+    df["G"] = rng.choice(["G1", "G2", "G3"], n)
+    return df
+
+def test_parsed_summarize_is_reusable():
+    w = Wrap(create_df())
+    w = w.let(T=w.df)
+    parsed = parse_expression_query("T | summarize x = avg(A) + max(B), y = count() by G")
+
+    r1 = parsed.evaluate_query(w).df
+    r2 = parsed.evaluate_query(w).df
+
+    pd.testing.assert_frame_equal(r1, r2)
+
+def test_parsed_summarize_does_not_change_tree():
+    w = Wrap(create_df())
+    w = w.let(T=w.df)
+    parsed = parse_expression_query("T | summarize x = sum(B) by G")
+    before = str(vars(parsed.query_statements[0].tabular_operators[1].aggregates[0].right))
+    parsed.evaluate_query(w)
+    after = str(vars(parsed.query_statements[0].tabular_operators[1].aggregates[0].right))
+    assert before == after
+
+def test_concurrent_queries_share_parsed_tree():
+    df = create_df()
+    w = Wrap(df)
+    queries = [
+        "self | where A > 0.5 | summarize x = sum(B), y = avg(A) + 1 by G | sort by G asc",
+        "self | summarize percentiles(B, 50, 90), dcount(B) by G | sort by G asc",
+        "self | extend C = A * 2 | summarize z = max(C) - min(C) by G | sort by G asc",
+    ]
+    expected = [w.execute(q).df for q in queries]
+
+    def run(i):
+        q = i % len(queries)
+        return q, w.execute(queries[q]).df
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(run, range(60)))
+
+    for q, result in results:
+        pd.testing.assert_frame_equal(expected[q], result)
+
+    # the input table is never modified
+    pd.testing.assert_frame_equal(create_df(), df)
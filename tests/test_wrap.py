@@ -44,6 +44,20 @@ class TestWrap(unittest.TestCase):
         self.assertListEqual([0, 2, 4, 6, 8], list(wnew.df["Z_col"]))
         self.assertGreater(len(w.df.columns), 2)
 
+    def test_project_list(self):
+        df = create_df()
+        w = Wrap(df)
+        wnew = w.project(["A", "B"], "C")
+        self.assertListEqual(["A", "B", "C"], list(wnew.df.columns))
+
+    def test_fluent_does_not_parse_query(self):
+        from kusto_pandas.expression_parser import get_parse_cache, clear_parse_cache
+        clear_parse_cache()
+        w = Wrap(create_df())
+        w.extend(Z="B * 2").where("Z > 2").project("A", "Z")
+        roots = set(root for _, root in get_parse_cache()._entries.keys())
+        self.assertNotIn("kustoQuery", roots)
+
     def test_extend(self):
         df = create_df()
         w = Wrap(df)
@@ -61,6 +75,16 @@ class TestWrap(unittest.TestCase):
 
         assert ["B", "Column1", "Column2"] == list(wnew.df.columns)
     
+    def test_extend_noname_chain(self):
+        df = create_df()
+        df = df[["B"]]
+        w = Wrap(df)
+        wnew = w.execute("self | extend B*2 | where Column1 > 2 | extend B+1 | sort by Column1_1 asc")
+
+        assert ["B", "Column1", "Column1_1"] == list(wnew.df.columns)
+        assert [4, 6, 8] == list(wnew.df["Column1"])
+        assert [3, 4, 5] == list(wnew.df["Column1_1"])
+    
     def test_where(self):
         df = create_df()
         w = Wrap(df)
@@ -169,6 +193,16 @@ class TestWrap(unittest.TestCase):
         self.assertListEqual([0, 1], list(wnew.df["B"]))
         self.assertEqual(5, len(w.df["B"]))
 
+    def test_take_more_or_negative(self):
+        df = create_df()
+        w = Wrap(df)
+        self.assertListEqual([0, 1, 2, 3, 4], list(w.take(10).df["B"]))
+        self.assertListEqual([], list(w.take(0).df["B"]))
+        # like df.head, a negative n drops the last rows
+        self.assertListEqual([0, 1, 2], list(w.take(-2).df["B"]))
+        self.assertListEqual([], list(w.take(-10).df["B"]))
+        self.assertListEqual([2], list(w.where("B > 1").take(-2).df["B"]))
+
     def test_take_expression(self):
         df = create_df()
         w = Wrap(df)
@@ -210,6 +244,32 @@ class TestWrap(unittest.TestCase):
         self.assertListEqual([0, 1, 2, 4, 3], list(wnew.df["B"]))
         self.assertListEqual(list(range(5)), list(w.df["B"]))
     
+    def test_where_sort_take_selection(self):
+        df = create_df()
+        df.index = [10, 11, 12, 13, 14]
+        w = Wrap(df)
+        wnew = w.where("B > 0").sort("A desc").take(3).where("G == 'G1'")
+        # the rows are not copied until df is used
+        self.assertIs(df, wnew._df)
+        self.assertListEqual([3], list(wnew._rows))
+        self.assertListEqual([13], list(wnew.df.index))
+        self.assertListEqual([3], list(wnew.df["B"]))
+        self.assertListEqual([1], list(wnew.count().df["Count"]))
+
+        wnew = w.where("B > 1").project("C", E="B * 2")
+        self.assertListEqual(["foo3", "foo4", "foo5"], list(wnew.df["C"]))
+        self.assertListEqual([4, 6, 8], list(wnew.df["E"]))
+        self.assertListEqual([12, 13, 14], list(wnew.df.index))
+
+    def test_set_df(self):
+        w = Wrap(create_df()).where("B > 2")
+        self.assertListEqual([3, 4], list(w.df["B"]))
+
+        # the selection of rows belongs to the old table
+        w.df = pd.DataFrame({"B": [7, 8]})
+        self.assertListEqual([7, 8], list(w.df["B"]))
+        self.assertListEqual([8], list(w.where("B > 7").df["B"]))
+
     def test_sort_asc_desc(self):
         df = create_df()
         df["U"] = [9, 9, 7, 1, 2]
@@ -268,6 +328,18 @@ class TestWrap(unittest.TestCase):
         pd.testing.assert_frame_equal(wnew.df, wexpected.df)
 
 
+    def test_top_ties_and_nulls(self):
+        df = pd.DataFrame()
+        df["U"] = [3.0, np.nan, 5.0, 3.0, 5.0, 1.0, 3.0, np.nan]
+        df["V"] = [1, 2, 3, 4, 5, 6, 7, 8]
+        df["S"] = ["b", "a", "c", "a", "b", "c", "a", "b"]
+        w = Wrap(df)
+        for n in [0, 1, 3, 4, 6, 7, 8, 10]:
+            for by in ["U", "U asc", "U desc, V asc", "U asc, V desc", "S, U asc", "V * 0, U"]:
+                wexpected = w.sort(by).take(n)
+                wnew = w.top(n, by)
+                pd.testing.assert_frame_equal(wnew.df, wexpected.df)
+
     def test_top_input_expression(self):
         df = create_df()
         df["U"] = [9, 8, 7, 1, 2]
@@ -433,6 +505,44 @@ def test_project_reorder():
     assert ["C", "A", "AA", "B"] == list(wnew.df.columns)
     assert ["A", "AA", "B", "C"] == list(w.df.columns)
 
+def test_project_operators_share_columns():
+    df = create_df()
+    df["AA"] = [5.0, 6.0, 7.0, 8.0, 9.0]
+
+    w = Wrap(df)
+    wnew = w.project_away("D").project_rename(X="A", Y="C").project_reorder("G", "Y").project_keep("*")
+    wnew = wnew.execute("self | project-away B | project-keep X, Y, G, AA")
+
+    assert ["G", "Y", "X", "AA"] == list(wnew.df.columns)
+    original = {"G": "G", "Y": "C", "X": "A", "AA": "AA"}
+    for col, orig_col in original.items():
+        assert np.shares_memory(wnew.df[col].to_numpy(), df[orig_col].to_numpy()), col
+
+    assert ["A", "B", "C", "D", "G", "AA"] == list(df.columns)
+
+def test_extend_shares_columns():
+    df = create_df()
+    w = Wrap(df)
+    wnew = w.extend(A="A * 2", Z="B + 1")
+
+    assert [0.0, 2.0, 4.0, 6.0, 8.0] == list(wnew.df["A"])
+    assert [0.0, 1.0, 2.0, 3.0, 4.0] == list(df["A"])
+    for col in ["B", "C", "D", "G"]:
+        assert np.shares_memory(wnew.df[col].to_numpy(), df[col].to_numpy()), col
+
+def test_input_is_never_modified():
+    df = create_df()
+    expected = df.copy()
+    w = Wrap(df)
+
+    w.extend(A="A * 2", C="strlen(C)").where("A > 1").project_rename(X="B").df
+    w.sort("B desc").take(3).extend(B="B + 1").project_away("C").project_reorder("G").df
+    w.execute("self | extend G = 'x' | summarize count() by G").df
+    w.top(2, "A").extend(A=1).df
+    w.lazy().where("B > 0").extend(B="B * 10").project("B", "C").take(2).df
+
+    pd.testing.assert_frame_equal(expected, df)
+
 def test_count():
     df = create_df()
     w = Wrap(df)
@@ -739,6 +849,42 @@ def test_let_elementwise_multiple_params():
 
     assert [3, 5] == list(wnew.df["B"])
 
+def test_let_jit():
+    df = pd.DataFrame()
+    df["A"] = [1, 2, 3]
+    df["B"] = [0.5, 1.5, 2.5]
+
+    def score(a, b):
+        if a > 1:
+            return a * b
+        return a / 4
+
+    w = Wrap(df).let_jit(score=score)
+    wnew = w.extend("S = score(A, B + 1)")
+
+    assert [0.25, 5.0, 10.5] == list(wnew.df["S"])
+
+    try:
+        import numba
+    except ImportError:
+        return
+    # score was compiled into a ufunc for the int and float columns, rather than applied to each row
+    ufunc = ep.utils._jit_ufuncs[score]
+    assert isinstance(ufunc, numba.np.ufunc.dufunc.DUFunc)
+    assert 1 == len(ufunc.types)
+
+def test_let_jit_falls_back_for_strings():
+    df = pd.DataFrame()
+    df["A"] = ["hello", "alice", "bob"]
+
+    def first(s):
+        return s[0]
+
+    w = Wrap(df).let_elementwise(jit=True, first1=first)
+    wnew = w.extend("B = first1(A)")
+
+    assert ["h", "a", "b"] == list(wnew.df["B"])
+
 def test_let_no_params():
     df = pd.DataFrame()
     df["A"] = [1, 1]
@@ -767,6 +913,20 @@ def test_let_new_method_overrides_old_one():
     assert ["A", "B"] == list(wnew.df.columns)
     assert [3, 4] == list(wnew.df["B"])
 
+def test_let_scope_precedence():
+    df = pd.DataFrame()
+    df["A"] = [1, 2]
+
+    w = Wrap(df).let(A=100, c=1, log=lambda x: x)
+    w2 = w.let(c=2)
+
+    # columns come first, then the built in methods, then the newest let
+    wnew = w2.extend("B = A + c", "L = log(A)")
+    assert [3, 4] == list(wnew.df["B"])
+    assert list(np.log([1, 2])) == list(wnew.df["L"])
+    # w is not affected by the let on w2
+    assert [2, 3] == list(w.extend("B = A + c").df["B"])
+
 def test_union():
     df = pd.DataFrame()
     df["A"] = [1, 2]